@@ -8,7 +8,7 @@ import json
 import os
 import secrets
 from datetime import datetime
-from flask import Flask, request, jsonify, redirect
+from flask import Flask, request, jsonify, redirect, g
 from flask_cors import CORS
 
 # Optional imports
@@ -77,13 +77,18 @@ def init_db():
             last_deal_ids TEXT
         )
     ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_verified ON subscribers(verified)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_verify_token ON subscribers(verify_token)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_unsubscribe_token ON subscribers(unsubscribe_token)')
     conn.commit()
     return conn
 
 def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """One connection per request (app.run spawns a thread per request), closed on teardown."""
+    if 'db' not in g:
+        g.db = sqlite3.connect(DB_PATH)
+        g.db.row_factory = sqlite3.Row
+    return g.db
 
 def generate_token():
     return secrets.token_urlsafe(32)
@@ -130,6 +135,12 @@ def add_security_headers(response):
     response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
     return response
 
+@app.teardown_appcontext
+def close_db(exception):
+    conn = g.pop('db', None)
+    if conn is not None:
+        conn.close()
+
 @app.errorhandler(500)
 def internal_error(e):
     return jsonify({"error": "Internal server error"}), 500
@@ -163,22 +174,21 @@ def subscribe():
     
     valid_cities = ['София', 'Пловдив', 'Варна', 'Бургас', 'Русе', 'Стара Загора']
     cities = [c for c in cities if c in valid_cities]
-    min_discount = max(10, min(70, int(min_discount)))
+    try:
+        min_discount = max(10, min(70, int(min_discount)))
+    except (ValueError, TypeError):
+        min_discount = 20
     
     conn = get_db()
     c = conn.cursor()
     
-    c.execute('SELECT id, verified FROM subscribers WHERE email = ?', (email,))
+    c.execute('SELECT verified, verify_token FROM subscribers WHERE email = ?', (email,))
     existing = c.fetchone()
     
     if existing:
         if existing['verified']:
-            conn.close()
             return jsonify({"error": "Този имейл вече е абониран"}), 400
-        c.execute('SELECT verify_token FROM subscribers WHERE id = ?', (existing['id'],))
-        token = c.fetchone()['verify_token']
-        send_verification_email(email, token)
-        conn.close()
+        send_verification_email(email, existing['verify_token'])
         return jsonify({"message": "Изпратихме нов линк за потвърждение"})
     
     verify_token = generate_token()
@@ -188,7 +198,6 @@ def subscribe():
                  VALUES (?, ?, ?, ?, ?)''',
               (email, json.dumps(cities), min_discount, verify_token, unsubscribe_token))
     conn.commit()
-    conn.close()
     
     if send_verification_email(email, verify_token):
         return jsonify({"message": "Изпратихме имейл за потвърждение!"})
@@ -206,13 +215,11 @@ def verify():
     sub = c.fetchone()
     
     if not sub:
-        conn.close()
         return safe_redirect(f"{SITE_URL}?error=invalid_token")
     
     c.execute('UPDATE subscribers SET verified = 1, verified_at = ?, verify_token = NULL WHERE id = ?',
               (datetime.utcnow().isoformat(), sub['id']))
     conn.commit()
-    conn.close()
     return safe_redirect(f"{SITE_URL}?verified=true")
 
 @app.route('/unsubscribe', methods=['GET'])
@@ -225,7 +232,6 @@ def unsubscribe():
     c = conn.cursor()
     c.execute('DELETE FROM subscribers WHERE unsubscribe_token = ?', (token,))
     conn.commit()
-    conn.close()
     return safe_redirect(f"{SITE_URL}?unsubscribed=true")
 
 @app.route('/stats', methods=['GET'])
@@ -234,7 +240,6 @@ def stats():
     c = conn.cursor()
     c.execute('SELECT COUNT(*) FROM subscribers WHERE verified = 1')
     count = c.fetchone()[0]
-    conn.close()
     return jsonify({"subscribers": count})
 
 if __name__ == '__main__':
@@ -28,6 +28,8 @@ def init_db():
     
     c.execute('CREATE INDEX IF NOT EXISTS idx_email ON subscribers(email)')
     c.execute('CREATE INDEX IF NOT EXISTS idx_verified ON subscribers(verified)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_verify_token ON subscribers(verify_token)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_unsubscribe_token ON subscribers(unsubscribe_token)')
     
     conn.commit()
     print(f"✅ Created {DB_PATH}")
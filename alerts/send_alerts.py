@@ -50,7 +50,7 @@ def get_verified_subscribers(conn) -> List[Dict]:
     """Get all verified subscribers."""
     c = conn.cursor()
     c.execute('''
-        SELECT id, email, cities, min_discount, last_deal_ids 
+        SELECT id, email, cities, min_discount, last_deal_ids, unsubscribe_token
         FROM subscribers 
         WHERE verified = 1
     ''')
@@ -61,7 +61,8 @@ def get_verified_subscribers(conn) -> List[Dict]:
             'email': row[1],
             'cities': json.loads(row[2]) if row[2] else [],
             'min_discount': row[3] or 20,
-            'last_deal_ids': set(json.loads(row[4])) if row[4] else set()
+            'last_deal_ids': set(json.loads(row[4])) if row[4] else set(),
+            'unsubscribe_token': row[5] or '',
         })
     return subscribers
 
@@ -222,6 +223,7 @@ def main():
     
     # Send emails
     sent_count = 0
+    api_base = os.getenv("API_URL", "https://web-production-36c65.up.railway.app")
     for sub in subscribers:
         matching_deals = filter_deals_for_subscriber(deals, sub)
         
@@ -229,13 +231,7 @@ def main():
             log(f"  {sub['email']}: 0 matching deals, skipping")
             continue
         
-        # Get unsubscribe token from DB
-        c2 = conn.cursor()
-        c2.execute('SELECT unsubscribe_token FROM subscribers WHERE id = ?', (sub['id'],))
-        row = c2.fetchone()
-        unsub_token = row[0] if row else ''
-        api_base = os.getenv("API_URL", "https://web-production-36c65.up.railway.app")
-        unsubscribe_url = f"{api_base}/unsubscribe?token={unsub_token}"
+        unsubscribe_url = f"{api_base}/unsubscribe?token={sub['unsubscribe_token']}"
         
         # Generate email
         subject = f"🏠 {len(matching_deals)} нови оферти под пазарната цена"
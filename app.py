@@ -10,9 +10,11 @@ import json
 import os
 import re
 import secrets
+import threading
 import time as _time
 from collections import defaultdict
 from datetime import datetime
+from functools import lru_cache
 from urllib.parse import urlparse
 
 from flask import Flask, request, jsonify, redirect, g
@@ -33,6 +35,7 @@ USE_POSTGRES = DATABASE_URL.startswith("postgresql://") or DATABASE_URL.startswi
 if USE_POSTGRES:
     import psycopg2
     import psycopg2.extras
+    import psycopg2.pool
     # Railway sometimes gives postgres:// but psycopg2 needs postgresql://
     if DATABASE_URL.startswith("postgres://"):
         DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
@@ -68,32 +71,80 @@ app.config['MAX_CONTENT_LENGTH'] = 1024
 # Database abstraction
 # ============================================================
 
+# SQLite connections are kept per worker thread and reused across requests
+_local = threading.local()
+
+# Postgres connections come from a per-process pool sized to gunicorn's threads
+# (gunicorn.conf.py). The pool raises instead of blocking when exhausted, so it is
+# never smaller than the thread count.
+WEB_THREADS = int(os.getenv("WEB_THREADS", 4))
+PG_POOL_MAX = max(int(os.getenv("PG_POOL_MAX", WEB_THREADS)), WEB_THREADS)
+_pg_pool = None
+_pg_pool_lock = threading.Lock()
+
+def _pg_conn():
+    global _pg_pool
+    if _pg_pool is None:
+        with _pg_pool_lock:
+            if _pg_pool is None:
+                # minconn == maxconn: psycopg2 only keeps returned connections up to minconn
+                _pg_pool = psycopg2.pool.ThreadedConnectionPool(PG_POOL_MAX, PG_POOL_MAX, DATABASE_URL)
+    # Ping before use: the server or a proxy may have dropped an idle connection.
+    # Dead ones are discarded; once the idle ones are used up the pool connects afresh.
+    for attempt in range(PG_POOL_MAX + 1):
+        conn = _pg_pool.getconn()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.autocommit = False
+            return conn
+        except psycopg2.Error:
+            _pg_pool.putconn(conn, close=True)
+            if attempt == PG_POOL_MAX:
+                raise
+
+def _sqlite_conn():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        os.makedirs(os.path.dirname(SQLITE_PATH) if os.path.dirname(SQLITE_PATH) else '.', exist_ok=True)
+        conn = sqlite3.connect(SQLITE_PATH)
+        conn.row_factory = sqlite3.Row
+        _local.conn = conn
+    return conn
+
 def get_db():
     """Get a database connection, stored in Flask's g for request lifecycle."""
     if 'db' not in g:
         if USE_POSTGRES:
-            g.db = psycopg2.connect(DATABASE_URL)
-            g.db.autocommit = False
+            g.db = _pg_conn()
         else:
-            os.makedirs(os.path.dirname(SQLITE_PATH) if os.path.dirname(SQLITE_PATH) else '.', exist_ok=True)
-            g.db = sqlite3.connect(SQLITE_PATH)
-            g.db.row_factory = sqlite3.Row
+            g.db = _sqlite_conn()
     return g.db
 
 @app.teardown_appcontext
 def close_db(exception):
     db = g.pop('db', None)
     if db is not None:
-        if exception:
+        if USE_POSTGRES:
+            if exception and not db.closed:
+                db.rollback()
+            # The pool rolls back any transaction still open before reuse
+            _pg_pool.putconn(db)
+        elif db.in_transaction:
+            # Never hand an open transaction to the thread's next request
             db.rollback()
-        db.close()
+
+@lru_cache(maxsize=64)
+def _pg_query(query):
+    """Convert ? placeholders to %s for psycopg2 (queries are a small fixed set)."""
+    return query.replace('?', '%s')
 
 def db_execute(query, params=None):
     """Execute a query, adapting placeholders for Postgres (%s) vs SQLite (?)."""
     conn = get_db()
     if USE_POSTGRES:
-        # Convert ? placeholders to %s for psycopg2
-        query = query.replace('?', '%s')
+        query = _pg_query(query)
         cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     else:
         cur = conn.cursor()
@@ -141,6 +192,12 @@ def init_db():
             )
         ''')
 
+        # /stats and the alert run both filter subscribers on verified
+        c.execute('CREATE INDEX IF NOT EXISTS idx_verified ON subscribers(verified)')
+        # /verify and /unsubscribe look subscribers up by token
+        c.execute('CREATE INDEX IF NOT EXISTS idx_verify_token ON subscribers(verify_token)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_unsubscribe_token ON subscribers(unsubscribe_token)')
+
         c.execute('''
             CREATE TABLE IF NOT EXISTS users (
                 id SERIAL PRIMARY KEY,
@@ -191,6 +248,11 @@ def init_db():
             )
         ''')
 
+        # /stats and the alert run both filter subscribers on verified
+        c.execute('CREATE INDEX IF NOT EXISTS idx_verified ON subscribers(verified)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_verify_token ON subscribers(verify_token)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_unsubscribe_token ON subscribers(unsubscribe_token)')
+
         c.execute('''
             CREATE TABLE IF NOT EXISTS users (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -364,15 +426,13 @@ def subscribe():
         min_discount = 20
 
     # Check existing
-    existing = db_fetchone('SELECT id, verified FROM subscribers WHERE email = ?', (email,))
+    existing = db_fetchone('SELECT verified, verify_token FROM subscribers WHERE email = ?', (email,))
 
     if existing:
-        verified = existing['verified'] if USE_POSTGRES else existing[1] if not hasattr(existing, 'keys') else existing['verified']
+        verified = existing['verified'] if USE_POSTGRES else existing[0] if not hasattr(existing, 'keys') else existing['verified']
         if verified:
             return jsonify({"error": "Този имейл вече е абониран"}), 400
-        row_id = existing['id'] if USE_POSTGRES else existing[0] if not hasattr(existing, 'keys') else existing['id']
-        token_row = db_fetchone('SELECT verify_token FROM subscribers WHERE id = ?', (row_id,))
-        token = token_row['verify_token'] if USE_POSTGRES else token_row[0] if not hasattr(token_row, 'keys') else token_row['verify_token']
+        token = existing['verify_token'] if USE_POSTGRES else existing[1] if not hasattr(existing, 'keys') else existing['verify_token']
         send_verification_email(email, token)
         return jsonify({"message": "Изпратихме нов линк за потвърждение"})
 
@@ -423,10 +483,25 @@ def unsubscribe():
     db_commit()
     return safe_redirect(f"{SITE_URL}?unsubscribed=true")
 
+# The site polls /stats; the subscriber count only needs to be roughly fresh
+STATS_CACHE_TTL = 60  # seconds
+_stats_cache = (0.0, None)  # (monotonic time, count)
+_stats_lock = threading.Lock()
+
+def _stats_expired(cached_at, count):
+    return count is None or _time.monotonic() - cached_at >= STATS_CACHE_TTL
+
 @app.route('/stats', methods=['GET'])
 def stats():
-    row = db_fetchone('SELECT COUNT(*) as cnt FROM subscribers WHERE verified = ?', (True if USE_POSTGRES else 1,))
-    count = row['cnt'] if USE_POSTGRES else row[0] if not hasattr(row, 'keys') else row['cnt']
+    global _stats_cache
+    cached_at, count = _stats_cache
+    if _stats_expired(cached_at, count):
+        with _stats_lock:  # one thread refreshes, the others reuse its result
+            cached_at, count = _stats_cache
+            if _stats_expired(cached_at, count):
+                row = db_fetchone('SELECT COUNT(*) as cnt FROM subscribers WHERE verified = ?', (True if USE_POSTGRES else 1,))
+                count = row['cnt'] if USE_POSTGRES else row[0] if not hasattr(row, 'keys') else row['cnt']
+                _stats_cache = (_time.monotonic(), count)
     return jsonify({"subscribers": count})
 
 # ============================================================
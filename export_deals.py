@@ -9,17 +9,50 @@ Export Deals v4 - Complete QA fixes
 
 import json
 import sqlite3
+from bisect import bisect_left, bisect_right
 from datetime import datetime
+from functools import lru_cache
 import os
 import re
 import sys
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src', 'matching'))
 from neighborhood_matcher import extract_neighborhood, normalize_neighborhood, neighborhood_similarity
 
+# Optional: orjson writes the same indent=2 bytes ~15x faster
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 DB_PATH = "data/auctions.db"
 MARKET_DB = "data/market.db"
 
 
+def _connect(path):
+    """Open a read-mostly SQLite connection with a larger cache and mmap I/O."""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")     # 64 MB page cache
+    conn.execute("PRAGMA mmap_size=268435456")   # 256 MB
+    return conn
+
+
+CITY_PREFIXES = ('гр. ', 'с. ')  # град / село as written in court listings
+
+
+@lru_cache(maxsize=1024)
+def _clean_city(city):
+    """Strip the 'гр. ' / 'с. ' settlement prefix: 'гр. София' → 'София'."""
+    if not city:
+        return ''
+    city = city.strip()
+    for prefix in CITY_PREFIXES:
+        if city.startswith(prefix):
+            return city[len(prefix):].strip()
+    return city
+
+
 def _title_hood(name):
     """Title-case a neighborhood name, handling hyphens: 'здравец-север' → 'Здравец-Север'."""
     if not name:
@@ -75,20 +108,45 @@ ROOM_TYPE_SIZE_BANDS = {
     'четиристаен': (100, 200),  # 4-bed
     'многостаен':  (100, 600),  # 4+ bed
 }
+_ROOM_TYPE_RE = re.compile('|'.join(map(re.escape, ROOM_TYPE_SIZE_BANDS)))
+
+# Discount % needed for 2, 3, 4 and 5 stars (any positive discount earns 1 star)
+SCORE_DISCOUNT_THRESHOLDS = (10, 20, 30, 40)
 
 def _room_type_band(property_type_bg: str):
     """Return (min_sqm, max_sqm) size band for a Bulgarian property type string, or None."""
     if not property_type_bg:
         return None
-    pt = property_type_bg.lower()
-    for key, band in ROOM_TYPE_SIZE_BANDS.items():
-        if key in pt:
-            return band
-    return None
+    # One scan for all room-type keys instead of a substring test per key
+    m = _ROOM_TYPE_RE.search(property_type_bg.lower())
+    return ROOM_TYPE_SIZE_BANDS[m.group()] if m else None
+
+
+def load_market_listings():
+    """Load usable market comparables once, grouped by city and sorted by size.
+
+    Returns {city: (sizes, rows)} where rows are (size_sqm, price_per_sqm, neighborhood)
+    tuples in ascending size order and sizes is the parallel list used for bisect.
+    """
+    if not os.path.exists(MARKET_DB):
+        return {}
+
+    market_conn = _connect(MARKET_DB)
+    grouped = {}
+    for city, size_sqm, pps, hood in market_conn.execute("""
+        SELECT city, size_sqm, price_per_sqm, neighborhood FROM market_listings
+        WHERE price_per_sqm IS NOT NULL AND price_per_sqm > 200 AND price_per_sqm < 5000
+        AND size_sqm IS NOT NULL
+        ORDER BY city, size_sqm
+    """):
+        grouped.setdefault(city, []).append((size_sqm, pps, hood))
+    market_conn.close()
+
+    return {city: ([r[0] for r in rows], rows) for city, rows in grouped.items()}
 
 
 def get_market_median(city, size_sqm, address=None, db_neighborhood=None,
-                      size_tolerance=10, property_type_bg=None):
+                      size_tolerance=10, property_type_bg=None, market=None):
     """Get market median from scraped data with neighborhood matching.
     
     Matching priority:
@@ -99,16 +157,19 @@ def get_market_median(city, size_sqm, address=None, db_neighborhood=None,
       5. City + size ±10sqm + room-type band  (city fallback, still typed)
       6. City + size ±10sqm                   (city fallback)
 
+    market: output of load_market_listings(); loaded on demand if omitted.
+
     Returns (median, count, matched_hood, match_level)
     match_level: 'hood' | 'city_size' | 'city'
     """
-    if not os.path.exists(MARKET_DB):
-        return None, 0, None, None
+    if market is None:
+        market = load_market_listings()
 
-    market_conn = sqlite3.connect(MARKET_DB)
-    cursor = market_conn.cursor()
+    city_clean = _clean_city(city)
+    sizes, city_rows = market.get(city_clean, ([], []))
+    if not city_rows:
+        return None, 0, None, None
 
-    city_clean = city.replace('гр. ', '').replace('с. ', '').strip() if city else ''
     size_min = size_sqm - size_tolerance
     size_max = size_sqm + size_tolerance
     room_band = _room_type_band(property_type_bg)  # (min_sqm, max_sqm) or None
@@ -124,112 +185,94 @@ def get_market_median(city, size_sqm, address=None, db_neighborhood=None,
     SIMILARITY_THRESHOLD = 0.7
     MIN_COMPS = 3
 
-    def _fetch_hood(size_clause, size_params):
-        """Fetch all market listings for this city with a neighborhood, apply size filter."""
-        cursor.execute(f"""
-            SELECT price_per_sqm, neighborhood FROM market_listings
-            WHERE city = ? AND neighborhood IS NOT NULL
-            AND price_per_sqm IS NOT NULL AND price_per_sqm > 200 AND price_per_sqm < 5000
-            {size_clause}
-        """, [city_clean] + size_params)
-        return cursor.fetchall()
+    def _window(lo=None, hi=None):
+        """Rows with lo <= size_sqm <= hi (inclusive, like SQL BETWEEN)."""
+        i = 0 if lo is None else bisect_left(sizes, lo)
+        j = len(sizes) if hi is None else bisect_right(sizes, hi)
+        return city_rows[i:j]
 
     def _match_hood(rows):
         """Filter rows by neighborhood similarity, return matched prices."""
-        return [pps for pps, mhood in rows
-                if neighborhood_similarity(auction_hood, mhood) >= SIMILARITY_THRESHOLD]
+        return [pps for _, pps, mhood in rows
+                if mhood is not None
+                and neighborhood_similarity(auction_hood, mhood) >= SIMILARITY_THRESHOLD]
 
     def _median(prices):
         s = sorted(prices)
         return s[len(s) // 2]
 
-    def _stats(prices):
-        """Return (median, min, max) for a price list."""
-        s = sorted(prices)
-        return s[len(s) // 2], s[0], s[-1]
-
     if auction_hood:
         # Pass 1: hood + size ±10sqm + room-type band (tightest — all three constraints)
         if room_band:
             band_min = max(size_min, room_band[0])
             band_max = min(size_max, room_band[1])
-            rows = _fetch_hood("AND size_sqm BETWEEN ? AND ?", [band_min, band_max])
-            prices = _match_hood(rows)
+            prices = _match_hood(_window(band_min, band_max))
             if len(prices) >= MIN_COMPS:
-                market_conn.close()
                 return _median(prices), len(prices), auction_hood, 'hood'
 
         # Pass 2: hood + size ±10sqm (no room filter)
-        rows = _fetch_hood("AND size_sqm BETWEEN ? AND ?", [size_min, size_max])
-        prices = _match_hood(rows)
+        prices = _match_hood(_window(size_min, size_max))
         if len(prices) >= MIN_COMPS:
-            market_conn.close()
             return _median(prices), len(prices), auction_hood, 'hood'
 
         # Pass 3: hood + room-type band, any size in neighborhood
         if room_band:
-            rows = _fetch_hood("AND size_sqm BETWEEN ? AND ?", list(room_band))
-            prices = _match_hood(rows)
+            prices = _match_hood(_window(*room_band))
             if len(prices) >= MIN_COMPS:
-                market_conn.close()
                 return _median(prices), len(prices), auction_hood, 'hood'
 
         # Pass 4: hood + any size (neighborhood signal is still better than city-wide)
-        rows = _fetch_hood("", [])
-        prices = _match_hood(rows)
+        prices = _match_hood(city_rows)
         if len(prices) >= MIN_COMPS:
-            market_conn.close()
             return _median(prices), len(prices), auction_hood, 'hood'
 
     # Pass 5: city + size ±10sqm + room-type band (city fallback, typed)
     if room_band:
         band_min = max(size_min, room_band[0])
         band_max = min(size_max, room_band[1])
-        cursor.execute("""
-            SELECT price_per_sqm FROM market_listings
-            WHERE city = ? AND size_sqm BETWEEN ? AND ?
-            AND price_per_sqm IS NOT NULL AND price_per_sqm > 200 AND price_per_sqm < 5000
-        """, (city_clean, band_min, band_max))
-        results = [r[0] for r in cursor.fetchall()]
+        results = [pps for _, pps, _ in _window(band_min, band_max)]
         if len(results) >= MIN_COMPS:
-            market_conn.close()
             return _median(results), len(results), None, 'city_size'
 
     # Pass 6: city + size ±10sqm
-    cursor.execute("""
-        SELECT price_per_sqm FROM market_listings
-        WHERE city = ? AND size_sqm BETWEEN ? AND ?
-        AND price_per_sqm IS NOT NULL AND price_per_sqm > 200 AND price_per_sqm < 5000
-    """, (city_clean, size_min, size_max))
-    results = [r[0] for r in cursor.fetchall()]
+    results = [pps for _, pps, _ in _window(size_min, size_max)]
     if len(results) >= MIN_COMPS:
-        market_conn.close()
         return _median(results), len(results), None, 'city_size'
 
-    market_conn.close()
     return None, 0, None, None
 
 
+def get_market_range(city, size_sqm, market, size_tolerance=10):
+    """Return rounded (min, max) price/sqm of city comparables within ±size_tolerance sqm."""
+    sizes, city_rows = market.get(city, ([], []))
+    lo = bisect_left(sizes, size_sqm - size_tolerance)
+    hi = bisect_right(sizes, size_sqm + size_tolerance)
+    if lo >= hi:
+        return None, None
+    prices = [pps for _, pps, _ in city_rows[lo:hi]]
+    return round(min(prices)), round(max(prices))
+
+
+@lru_cache(maxsize=4096)
+def _parse_auction_end(auction_end):
+    """Parse a DD.MM.YYYY or YYYY-MM-DD auction end date; None if unparseable."""
+    for fmt in ('%d.%m.%Y', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(auction_end, fmt)
+        except ValueError:
+            pass
+    return None
+
+
 def is_expired(auction_end):
     """Check if auction has expired."""
     if not auction_end:
         return False  # Can't determine, assume active
     
-    try:
-        # Try DD.MM.YYYY format
-        end_date = datetime.strptime(auction_end, '%d.%m.%Y')
-        return end_date < datetime.now()
-    except ValueError:
-        pass
-    
-    try:
-        # Try YYYY-MM-DD format
-        end_date = datetime.strptime(auction_end, '%Y-%m-%d')
-        return end_date < datetime.now()
-    except ValueError:
-        pass
-    
-    return False
+    end_date = _parse_auction_end(auction_end)
+    if end_date is None:
+        return False
+    return end_date < datetime.now()
 
 
 def export_deals():
@@ -239,18 +282,11 @@ def export_deals():
         print(f"Error: Database not found at {DB_PATH}")
         return [], {}
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect(DB_PATH)
     conn.row_factory = sqlite3.Row
     
-    # Ensure composite index exists for market queries
-    if os.path.exists(MARKET_DB):
-        try:
-            mconn = sqlite3.connect(MARKET_DB)
-            mconn.execute('CREATE INDEX IF NOT EXISTS idx_city_size ON market_listings(city, size_sqm)')
-            mconn.commit()
-            mconn.close()
-        except Exception:
-            pass
+    # Load market comparables once; medians are computed in memory per deal
+    market = load_market_listings()
     
     # Get all non-expired, non-excluded properties in target cities
     query = """
@@ -271,8 +307,7 @@ def export_deals():
     
     cursor = conn.execute(query)
     
-    for row in cursor:
-        row = dict(row)
+    for row in cursor:  # sqlite3.Row, read by column name without a dict copy
         stats['total'] += 1
         
         prop_type = (row['property_type'] or '').strip()
@@ -292,7 +327,7 @@ def export_deals():
         is_partial = row['is_partial_ownership']
         
         # Clean city name
-        city = (row['city'] or '').replace('гр. ', '').replace('с. ', '').strip()
+        city = _clean_city(row['city'])
         
         # Determine frontend type
         frontend_type = TYPE_MAP.get(prop_type, 'other')
@@ -309,8 +344,8 @@ def export_deals():
         
         if is_apartment and not is_partial:
             market_median, sample_size, matched_hood, match_level = get_market_median(
-                city, size, row['address'], db_neighborhood=row.get('neighborhood'),
-                property_type_bg=row.get('property_type')
+                city, size, row['address'], db_neighborhood=row['neighborhood'],
+                property_type_bg=row['property_type'], market=market
             )
             if market_median and sample_size >= 3:
                 market_avg = round(market_median)
@@ -318,23 +353,8 @@ def export_deals():
                 discount = round(((market_median - price_per_sqm) / market_median) * 100, 1)
                 if discount < 0:
                     discount = None  # Negative = overpriced, don't show unreliable discount
-                # Get min/max from same comparables (quick re-query)
-                try:
-                    _mconn = sqlite3.connect(MARKET_DB)
-                    _mc = _mconn.cursor()
-                    city_c = city.replace('гр. ', '').replace('с. ', '').strip()
-                    _mc.execute("""
-                        SELECT MIN(price_per_sqm), MAX(price_per_sqm) FROM market_listings
-                        WHERE city = ? AND price_per_sqm IS NOT NULL AND price_per_sqm > 200 AND price_per_sqm < 5000
-                        AND size_sqm BETWEEN ? AND ?
-                    """, (city_c, size - 10, size + 10))
-                    _r = _mc.fetchone()
-                    if _r and _r[0]:
-                        market_min_sqm = round(_r[0])
-                        market_max_sqm = round(_r[1])
-                    _mconn.close()
-                except Exception:
-                    pass
+                # Min/max from the city + size ±10sqm comparables
+                market_min_sqm, market_max_sqm = get_market_range(city, size, market)
             elif market_median:
                 # Not enough comparables for reliable discount
                 market_avg = round(market_median)
@@ -359,7 +379,7 @@ def export_deals():
             'market_max_sqm': market_max_sqm,
             'discount': discount if not is_partial else None,
             'property_type': frontend_type,
-            'floor': row.get('floor'),
+            'floor': row['floor'],
             'property_type_bg': row['property_type'],
             'auction_start': row['auction_start'],
             'auction_end': row['auction_end'],
@@ -369,21 +389,11 @@ def export_deals():
             'score': 0  # Will calculate below
         }
         
-        # Calculate score (1-5 stars)
-        if is_partial:
+        # Calculate score (1-5 stars); 0 = partial or no market comparison available
+        if is_partial or not discount:
             deal['score'] = 0
-        elif discount and discount >= 40:
-            deal['score'] = 5
-        elif discount and discount >= 30:
-            deal['score'] = 4
-        elif discount and discount >= 20:
-            deal['score'] = 3
-        elif discount and discount >= 10:
-            deal['score'] = 2
-        elif discount:
-            deal['score'] = 1
         else:
-            deal['score'] = 0  # No market comparison available
+            deal['score'] = 1 + bisect_right(SCORE_DISCOUNT_THRESHOLDS, discount)
         
         # Update stats
         if is_partial:
@@ -457,8 +467,12 @@ def main():
         'sources': ['imot.bg', 'olx.bg'],
         'deals': deals,
     }
-    with open(OUTPUT_PATH, 'w', encoding='utf-8') as f:
-        json.dump(output, f, ensure_ascii=False, indent=2)
+    if HAS_ORJSON:
+        with open(OUTPUT_PATH, 'wb') as f:
+            f.write(orjson.dumps(output, option=orjson.OPT_INDENT_2))
+    else:
+        with open(OUTPUT_PATH, 'w', encoding='utf-8') as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
     
     print(f"\n✓ Exported {len(deals)} deals to {OUTPUT_PATH}")
     return deals
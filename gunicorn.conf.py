@@ -0,0 +1,11 @@
+"""
+Gunicorn settings for the Railway API (picked up automatically from the CWD).
+"""
+
+import os
+
+# Threaded workers: requests mostly wait on the DB or Resend, so a few
+# threads per process overlap that I/O. WEB_THREADS also sizes the
+# Postgres connection pool in app.py.
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", 4))
@@ -9,6 +9,7 @@ Key functions:
 """
 
 import re
+from functools import lru_cache
 
 
 # Canonical neighborhood aliases (handles variations)
@@ -58,6 +59,15 @@ NEIGHBORHOOD_ALIASES = {
 }
 
 
+# Pre-compiled normalization patterns
+_PREFIX_RE = re.compile(r'^(ж\.?\s*к\.?|жк\.?|кв\.?|район|квартал|местност)\s*')
+_TRAILING_NUM_RE = re.compile(r'\s*\d+\s*$')
+_BLOCK_RE = re.compile(r'\s*бл\.?\s*\d+')
+_ENTRANCE_RE = re.compile(r'\s*вх\.?\s*[а-яa-z]')
+_STRIP_QUOTES = str.maketrans('', '', '"\'')
+
+
+@lru_cache(maxsize=8192)
 def normalize_neighborhood(text):
     """
     Normalize neighborhood name for comparison.
@@ -70,15 +80,15 @@ def normalize_neighborhood(text):
     text = text.lower().strip()
     
     # Remove common prefixes
-    text = re.sub(r'^(ж\.?\s*к\.?|жк\.?|кв\.?|район|квартал|местност)\s*', '', text)
+    text = _PREFIX_RE.sub('', text)
     
     # Remove block/entrance numbers (e.g., "Люлин 9" -> "Люлин")
-    text = re.sub(r'\s*\d+\s*$', '', text)
-    text = re.sub(r'\s*бл\.?\s*\d+', '', text)
-    text = re.sub(r'\s*вх\.?\s*[а-яa-z]', '', text)
+    text = _TRAILING_NUM_RE.sub('', text)
+    text = _BLOCK_RE.sub('', text)
+    text = _ENTRANCE_RE.sub('', text)
     
     # Remove quotes
-    text = text.replace('"', '').replace("'", '').strip()
+    text = text.translate(_STRIP_QUOTES).strip()
     
     # Check aliases
     for canonical, aliases in NEIGHBORHOOD_ALIASES.items():
@@ -88,6 +98,100 @@ def normalize_neighborhood(text):
     return text if text else None
 
 
+# Address patterns in order of specificity (explicit prefixes first)
+_HOOD_PATTERNS = [
+    re.compile(r'ж\.?\s*к\.?\s*["\u201e\u201c]?([а-яА-Я\s\d-]+)'),   # ж.к. X
+    re.compile(r'жк\.?\s*["\u201e\u201c]?([а-яА-Я\s\d-]+)'),          # жк X
+    re.compile(r'кв\.?\s*(?!м)(?!м²)["\u201e\u201c]?([а-яА-Я\s\d-]+)'),  # кв. X (not кв.м)
+    re.compile(r'квартал\s*["\u201e\u201c]?([а-яА-Я\s-]+)'),          # квартал X
+    re.compile(r'р-н\s*["\u201e\u201c]?([а-яА-Я\s-]+)'),              # р-н X (short for район)
+    re.compile(r'район\s*["\u201e\u201c„]?([а-яА-Я\s-]+)'),           # район X / район „X"
+    re.compile(r'местност\s*["\u201e\u201c]?([а-яА-Я\s-]+)'),         # местност X
+]
+
+# imot.bg title/H1 pattern: "... град [City], [Neighborhood]\n" or "... в [City], [Hood] -"
+_CITY_COMMA_RE = re.compile(
+    r'(?:град|гр\.)\s+[а-яА-Я]+,\s*([А-Яа-я][а-яА-Я\s\d]+?)(?:\s*[-\n,]|\s+кв\.?|\s+м²|\s*$)'
+)
+
+# imot.bg URL slug: "grad-sofiya-lyulin-9-ul-..." -> city slug, then neighborhood segment
+_SLUG_CITY_RE = re.compile(r'grad-([a-z]+(?:-[a-z]+)?)-')
+_SLUG_SEGMENT_RE = re.compile(r'([a-z][a-z-]+?)(?:-ul-|-bul-|-bl-|-\d+|-[a-z]{1,2}-|\s|$)')
+
+# Known city slugs to skip
+_CITY_SLUGS = {'sofiya', 'plovdiv', 'varna', 'burgas', 'ruse', 'stara-zagora', 'pleven'}
+
+# Transliterate common BG neighborhoods from Latin slugs
+_SLUG_MAP = {
+    'lyulin': 'люлин', 'mladost': 'младост', 'lozenets': 'лозенец',
+    'druzhba': 'дружба', 'nadezhda': 'надежда', 'krasno selo': 'красно село',
+    'studentski': 'студентски', 'ovcha kupel': 'овча купел',
+    'vitosha': 'витоша', 'banishora': 'банишора', 'hipodruma': 'хиподрума',
+    'ilinden': 'илинден', 'poduyane': 'подуяне',
+    'trakia': 'тракия', 'chaika': 'чайка', 'vladislavovo': 'владиславово',
+    'levski': 'левски', 'krastova vada': 'кръстова вада',
+    'geo milev': 'гео милев', 'borovo': 'борово', 'iztok': 'изток',
+    'izgrev': 'изгрев', 'manastirski livadi': 'манастирски ливади',
+    'gotse delchev': 'гоце делчев', 'red light': None,  # skip bad matches
+}
+
+# Street → neighborhood lookup (for addresses with no ж.к./кв./район prefix)
+# City-scoped to avoid false matches (ул. Македония exists in many Bulgarian cities).
+# Format: (street_fragment, neighborhood, [city_fragments_that_must_match])
+# city_fragments=[] means any city (street is sufficiently unique)
+STREET_HOOD_MAP = [
+    # Sofia — unique enough, unscoped
+    ('патриарх евтимий',        'центъра',              ['софия']),
+    ('витошка',                 'центъра',              ['софия']),
+    ('цар освободител',         'центъра',              ['софия']),
+    ('александър стамболийски', 'красно село',          ['софия']),
+    ('ивайло петров',           'люлин',                ['софия']),
+    ('светлоструй',             'красно село',          ['софия']),
+    ('роден кът',               'овча купел',           ['софия']),
+    # Varna — scoped to варна
+    ('паско желев',             'владислав варненчик',  ['варна']),
+    ('скопие',                  'владислав варненчик',  ['варна']),
+    ('ростов',                  'младост',              ['варна']),
+    ('д-р аршинкова',           'победа',               ['варна']),
+    # Varna — Цветен квартал (streets named after flowers)
+    # Source: OSM street directory for Цветен квартал suburb
+    # Note: BGMaps labels these as "жк Васил Левски" formally, but
+    # real estate market uses "Цветен квартал". Cluster fallback to Левски.
+    ('роза',                    'цветен квартал',       ['варна']),
+    ('люляк',                   'цветен квартал',       ['варна']),
+    ('нарцис',                  'цветен квартал',       ['варна']),
+    ('иглика',                  'цветен квартал',       ['варна']),
+    ('карамфил',                'цветен квартал',       ['варна']),
+    ('кокиче',                  'цветен квартал',       ['варна']),
+    ('незабравка',              'цветен квартал',       ['варна']),
+    ('трендафил',               'цветен квартал',       ['варна']),
+    ('тинтява',                 'цветен квартал',       ['варна']),
+    ('лотос',                   'цветен квартал',       ['варна']),
+    ('ружа',                    'цветен квартал',       ['варна']),
+    ('синчец',                  'цветен квартал',       ['варна']),
+    ('еделвайс',               'цветен квартал',       ['варна']),
+    ('момина сълза',            'цветен квартал',       ['варна']),
+    ('бял крем',                'цветен квартал',       ['варна']),
+    ('зеленика',                'цветен квартал',       ['варна']),
+    ('белите лилии',            'цветен квартал',       ['варна']),
+    ('детелина',                'цветен квартал',       ['варна']),
+    # Plovdiv — scoped to пловдив
+    ('стефан стамболов',        'южен',                 ['пловдив']),
+    ('македония',               'южен',                 ['пловдив']),
+    ('босилек',                 'изгрев',               ['пловдив']),
+    ('лотос',                   'изгрев',               ['пловдив']),
+    # Ruse — scoped to русе
+    ('рени',                    'широк център',         ['русе']),
+    ('панайот волов',           'широк център',         ['русе']),
+]
+
+# One alternation over every street fragment: a single scan tells whether any
+# entry can match, so most addresses skip the ordered per-entry loop entirely.
+_STREET_FRAGMENT_RE = re.compile('|'.join(
+    re.escape(fragment) for fragment in dict.fromkeys(f for f, _, _ in STREET_HOOD_MAP)))
+
+
+@lru_cache(maxsize=8192)
 def extract_neighborhood(address):
     """
     Extract neighborhood/district from Bulgarian address string.
@@ -103,31 +207,16 @@ def extract_neighborhood(address):
 
     addr_lower = address.lower()
 
-    # Patterns in order of specificity (explicit prefixes first)
-    patterns = [
-        r'ж\.?\s*к\.?\s*["\u201e\u201c]?([а-яА-Я\s\d-]+)',   # ж.к. X
-        r'жк\.?\s*["\u201e\u201c]?([а-яА-Я\s\d-]+)',          # жк X
-        r'кв\.?\s*(?!м)(?!м²)["\u201e\u201c]?([а-яА-Я\s\d-]+)',  # кв. X (not кв.м)
-        r'квартал\s*["\u201e\u201c]?([а-яА-Я\s-]+)',          # квартал X
-        r'р-н\s*["\u201e\u201c]?([а-яА-Я\s-]+)',              # р-н X (short for район)
-        r'район\s*["\u201e\u201c„]?([а-яА-Я\s-]+)',           # район X / район „X"
-        r'местност\s*["\u201e\u201c]?([а-яА-Я\s-]+)',         # местност X
-    ]
-
-    for pattern in patterns:
-        match = re.search(pattern, addr_lower)
+    for pattern in _HOOD_PATTERNS:
+        match = pattern.search(addr_lower)
         if match:
             hood = match.group(1).strip()
             result = normalize_neighborhood(hood)
             if result and len(result) > 2:
                 return result
 
-    # imot.bg title/H1 pattern: "... град [City], [Neighborhood]\n" or "... в [City], [Hood] -"
     # e.g. "Продава 2-СТАЕН в град София, Кръстова вада - 79 кв.м"
-    city_comma = re.search(
-        r'(?:град|гр\.)\s+[а-яА-Я]+,\s*([А-Яа-я][а-яА-Я\s\d]+?)(?:\s*[-\n,]|\s+кв\.?|\s+м²|\s*$)',
-        address
-    )
+    city_comma = _CITY_COMMA_RE.search(address)
     if city_comma:
         hood = city_comma.group(1).strip()
         result = normalize_neighborhood(hood)
@@ -136,87 +225,25 @@ def extract_neighborhood(address):
 
     # imot.bg URL slug: extract segment after city slug
     # e.g. "grad-sofiya-lyulin-9-ul-asen-yordanov" -> "lyulin"
-    # Known city slugs to skip
-    _city_slugs = {'sofiya', 'plovdiv', 'varna', 'burgas', 'ruse', 'stara-zagora', 'pleven'}
-    slug_match = re.search(r'grad-([a-z]+(?:-[a-z]+)?)-', address)
+    slug_match = _SLUG_CITY_RE.search(address)
     if slug_match:
         after_city = address[slug_match.end():]
         # First hyphen-separated segment after city slug is usually the neighborhood
-        seg_match = re.match(r'([a-z][a-z-]+?)(?:-ul-|-bul-|-bl-|-\d+|-[a-z]{1,2}-|\s|$)', after_city)
+        seg_match = _SLUG_SEGMENT_RE.match(after_city)
         if seg_match:
             slug_hood = seg_match.group(1).replace('-', ' ')
-            # Transliterate common BG neighborhoods from Latin slugs
-            _slug_map = {
-                'lyulin': 'люлин', 'mladost': 'младост', 'lozenets': 'лозенец',
-                'druzhba': 'дружба', 'nadezhda': 'надежда', 'krasno selo': 'красно село',
-                'studentski': 'студентски', 'ovcha kupel': 'овча купел',
-                'vitosha': 'витоша', 'banishora': 'банишора', 'hipodruma': 'хиподрума',
-                'ilinden': 'илинден', 'poduyane': 'подуяне',
-                'trakia': 'тракия', 'chaika': 'чайка', 'vladislavovo': 'владиславово',
-                'levski': 'левски', 'krastova vada': 'кръстова вада',
-                'geo milev': 'гео милев', 'borovo': 'борово', 'iztok': 'изток',
-                'izgrev': 'изгрев', 'manastirski livadi': 'манастирски ливади',
-                'gotse delchev': 'гоце делчев', 'red light': None,  # skip bad matches
-            }
-            canonical = _slug_map.get(slug_hood)
+            canonical = _SLUG_MAP.get(slug_hood)
             if canonical:
                 return canonical
-            if len(slug_hood) > 3 and slug_hood not in _city_slugs:
+            if len(slug_hood) > 3 and slug_hood not in _CITY_SLUGS:
                 return normalize_neighborhood(slug_hood)
 
     # Street → neighborhood lookup (for addresses with no ж.к./кв./район prefix)
-    # City-scoped to avoid false matches (ул. Македония exists in many Bulgarian cities).
-    # Format: (street_fragment, neighborhood, [city_fragments_that_must_match])
-    # city_fragments=[] means any city (street is sufficiently unique)
-    _street_hood_map = [
-        # Sofia — unique enough, unscoped
-        ('патриарх евтимий',        'центъра',              ['софия']),
-        ('витошка',                 'центъра',              ['софия']),
-        ('цар освободител',         'центъра',              ['софия']),
-        ('александър стамболийски', 'красно село',          ['софия']),
-        ('ивайло петров',           'люлин',                ['софия']),
-        ('светлоструй',             'красно село',          ['софия']),
-        ('роден кът',               'овча купел',           ['софия']),
-        # Varna — scoped to варна
-        ('паско желев',             'владислав варненчик',  ['варна']),
-        ('скопие',                  'владислав варненчик',  ['варна']),
-        ('ростов',                  'младост',              ['варна']),
-        ('д-р аршинкова',           'победа',               ['варна']),
-        # Varna — Цветен квартал (streets named after flowers)
-        # Source: OSM street directory for Цветен квартал suburb
-        # Note: BGMaps labels these as "жк Васил Левски" formally, but
-        # real estate market uses "Цветен квартал". Cluster fallback to Левски.
-        ('роза',                    'цветен квартал',       ['варна']),
-        ('люляк',                   'цветен квартал',       ['варна']),
-        ('нарцис',                  'цветен квартал',       ['варна']),
-        ('иглика',                  'цветен квартал',       ['варна']),
-        ('карамфил',                'цветен квартал',       ['варна']),
-        ('кокиче',                  'цветен квартал',       ['варна']),
-        ('незабравка',              'цветен квартал',       ['варна']),
-        ('трендафил',               'цветен квартал',       ['варна']),
-        ('тинтява',                 'цветен квартал',       ['варна']),
-        ('лотос',                   'цветен квартал',       ['варна']),
-        ('ружа',                    'цветен квартал',       ['варна']),
-        ('синчец',                  'цветен квартал',       ['варна']),
-        ('еделвайс',               'цветен квартал',       ['варна']),
-        ('момина сълза',            'цветен квартал',       ['варна']),
-        ('бял крем',                'цветен квартал',       ['варна']),
-        ('зеленика',                'цветен квартал',       ['варна']),
-        ('белите лилии',            'цветен квартал',       ['варна']),
-        ('детелина',                'цветен квартал',       ['варна']),
-        # Plovdiv — scoped to пловдив
-        ('стефан стамболов',        'южен',                 ['пловдив']),
-        ('македония',               'южен',                 ['пловдив']),
-        ('босилек',                 'изгрев',               ['пловдив']),
-        ('лотос',                   'изгрев',               ['пловдив']),
-        # Ruse — scoped to русе
-        ('рени',                    'широк център',         ['русе']),
-        ('панайот волов',           'широк център',         ['русе']),
-    ]
-    for street_fragment, hood, city_scope in _street_hood_map:
-        if street_fragment in addr_lower:
-            if not city_scope or any(c in addr_lower for c in city_scope):
-                return normalize_neighborhood(hood)
+    if _STREET_FRAGMENT_RE.search(addr_lower):
+        for street_fragment, hood, city_scope in STREET_HOOD_MAP:
+            if street_fragment in addr_lower:
+                if not city_scope or any(c in addr_lower for c in city_scope):
+                    return normalize_neighborhood(hood)
 
     return None
 
@@ -236,6 +263,7 @@ NEIGHBORHOOD_CLUSTERS = {
 }
 
 
+@lru_cache(maxsize=16384)
 def neighborhood_similarity(hood1, hood2):
     """
     Calculate similarity score between two neighborhoods (0.0 to 1.0).
@@ -15,6 +15,15 @@ from typing import Optional, List
 import requests
 from bs4 import BeautifulSoup
 
+from scraper_db import connect
+
+# Prefer lxml (requirements-full.txt, with the other scraper deps) over html.parser
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
 # Injection hardening (REG-037 / security scan 2026-02-26)
 import sys as _sys, os as _os
 _sys.path.insert(0, _os.path.join(_os.path.dirname(__file__), '..', '..', 'scripts'))
@@ -25,6 +34,9 @@ except ImportError:
 
 DB_PATH = "data/market.db"
 
+# Thousands separators seen in scraped prices ("120 000", "120\xa0000")
+_STRIP_SPACES = str.maketrans('', '', ' \xa0\t')
+
 CITIES = {
     'София': 'https://www.alo.bg/obiavi/imoti-prodajbi/apartamenti-stai/?city_id=1',
     'Пловдив': 'https://www.alo.bg/obiavi/imoti-prodajbi/apartamenti-stai/?city_id=2',
@@ -52,7 +64,7 @@ class Listing:
 
 def init_db():
     os.makedirs(os.path.dirname(DB_PATH) if os.path.dirname(DB_PATH) else '.', exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect(DB_PATH)
     c = conn.cursor()
     c.execute('''CREATE TABLE IF NOT EXISTS market_listings (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -60,25 +72,33 @@ def init_db():
         price_eur REAL NOT NULL, price_per_sqm REAL NOT NULL,
         rooms INTEGER, source TEXT NOT NULL, scraped_at TEXT NOT NULL,
         UNIQUE(city, size_sqm, price_eur, source))''')
-    c.execute('CREATE INDEX IF NOT EXISTS idx_city ON market_listings(city)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_city_size_comps ON market_listings(city, size_sqm, price_per_sqm, neighborhood)')
     c.execute('CREATE INDEX IF NOT EXISTS idx_source ON market_listings(source)')
     conn.commit()
     return conn
 
+INSERT_LISTING_SQL = '''INSERT OR REPLACE INTO market_listings 
+    (city, neighborhood, size_sqm, price_eur, price_per_sqm, rooms, source, scraped_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)'''
+
 def save_listings(conn, listings):
-    c = conn.cursor()
-    saved = 0
-    for l in listings:
-        try:
-            c.execute('''INSERT OR REPLACE INTO market_listings 
-                (city, neighborhood, size_sqm, price_eur, price_per_sqm, rooms, source, scraped_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-                (l.city, l.neighborhood, l.size_sqm, l.price_eur, l.price_per_sqm, l.rooms, l.source, l.scraped_at))
-            saved += 1
-        except (sqlite3.Error, ValueError) as e:
-            continue
-    conn.commit()
-    return saved
+    rows = [(l.city, l.neighborhood, l.size_sqm, l.price_eur, l.price_per_sqm, l.rooms, l.source, l.scraped_at)
+            for l in listings]
+    before = conn.total_changes
+    try:
+        with conn:  # one transaction per city
+            conn.executemany(INSERT_LISTING_SQL, rows)
+    except sqlite3.Error as e:
+        # The batch was rolled back: retry row by row so only bad rows are skipped
+        print(f"DB error: {e}", end=" ")
+        before = conn.total_changes
+        with conn:
+            for row in rows:
+                try:
+                    conn.execute(INSERT_LISTING_SQL, row)
+                except sqlite3.Error:
+                    continue
+    return conn.total_changes - before
 
 def scrape_alo_city(city, url):
     """Scrape alo.bg listings for a city."""
@@ -93,10 +113,11 @@ def scrape_alo_city(city, url):
         print(f"ERROR: {e}")
         return listings
     
-    soup = BeautifulSoup(resp.text, 'html.parser')
+    soup = BeautifulSoup(resp.text, HTML_PARSER)
     
     # Find listing param containers
     param_divs = soup.find_all('div', class_='listtop-item-params')
+    scraped_at = datetime.utcnow().isoformat()  # one timestamp per city page
     
     for div in param_divs:
         try:
@@ -111,7 +132,7 @@ def scrape_alo_city(city, url):
             if not price_match:
                 continue
             
-            price_str = price_match.group(1).replace(' ', '').replace('\xa0', '')
+            price_str = price_match.group(1).translate(_STRIP_SPACES)
             price_eur = float(price_str)
             
             if price_eur < 10000 or price_eur > 2000000:
@@ -150,7 +171,7 @@ def scrape_alo_city(city, url):
                 price_per_sqm=round(price_eur / size_sqm, 2),
                 rooms=rooms,
                 source='alo.bg',
-                scraped_at=datetime.utcnow().isoformat()
+                scraped_at=scraped_at
             ))
             
         except (ValueError, TypeError, AttributeError):
@@ -12,8 +12,8 @@ import json
 import re
 import html
 import sqlite3
-import urllib.request
 import argparse
+from collections import Counter
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
@@ -24,6 +24,10 @@ import sys
 import socket
 import time
 
+import requests
+
+from scraper_db import connect
+
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 try:
     from security.scraper_sanitize import sanitize_text
@@ -37,6 +41,9 @@ DB_PATH = "data/auctions.db"
 REQUEST_TIMEOUT = 25
 MAX_RETRIES = 2
 MAX_WORKERS = 4  # Reduced for rate limiting
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+}
 
 COURTS = {
     1: "Благоевград", 2: "Бургас", 3: "Варна", 4: "Велико Търново",
@@ -48,21 +55,69 @@ COURTS = {
     25: "Шумен", 26: "Ямбол", 27: "София окръг", 28: "София град",
 }
 
+DB_BATCH_SIZE = 50  # Rows per executemany/commit during full scan
+
+UPSERT_AUCTION_SQL = """
+    INSERT INTO auctions 
+    (id, url, price_eur, city, neighborhood, address, property_type, size_sqm, rooms, floor,
+     is_partial_ownership, is_expired, auction_end, scraped_at, first_seen_at, last_updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        url=excluded.url, price_eur=excluded.price_eur, city=excluded.city,
+        neighborhood=excluded.neighborhood, address=excluded.address,
+        property_type=excluded.property_type, size_sqm=excluded.size_sqm,
+        rooms=excluded.rooms, floor=excluded.floor,
+        is_partial_ownership=excluded.is_partial_ownership,
+        is_expired=excluded.is_expired, auction_end=excluded.auction_end,
+        scraped_at=excluded.scraped_at, last_updated_at=excluded.last_updated_at
+"""
+
 # Pre-compiled regex patterns (thread-safe)
 SROK_PATTERN = re.compile(r'СРОК.*?до\s*(\d{2}\.\d{2}\.\d{4})', re.DOTALL | re.I)
 KRAI_PATTERN = re.compile(r'Край[^:]*:?\s*(\d{2}\.\d{2}\.\d{4})')
+PROPERTY_ID_PATTERN = re.compile(r'href="/properties/(\d+)"')
+PRICE_PATTERN = re.compile(r'<div class="price">([\d\s&;nbsp\.]+)\s*(EUR|лв)')
+TYPE_PATTERN = re.compile(r'</ul>\s*</div>\s*<div class="title">([^<]+)</div>\s*<div class="date">', re.DOTALL)
+TYPE_FALLBACK_PATTERN = re.compile(r'<div class="title">([^<]*(?:апартамент|къща|гараж|вила|парцел|земя|магазин|офис|ателие|склад|земеделска)[^<]*)</div>\s*<div class="(?:date|category)">', re.I)
+CITY_PATTERN = re.compile(r'(гр\.\s*[А-Яа-я\s-]+|с\.\s*[А-Яа-я\s-]+)')
+DISTRICT_PATTERN = re.compile(
+    r'<div[^>]*class="label"[^>]*>\s*Район\s*</div>\s*<div[^>]*class="info"[^>]*>(.*?)</div>',
+    re.DOTALL | re.IGNORECASE)
+ADDRESS_PATTERN = re.compile(
+    r'<div[^>]*class="label"[^>]*>\s*Адрес\s*</div>\s*<div[^>]*class="info"[^>]*>(.*?)</div>',
+    re.DOTALL | re.IGNORECASE)
+TAG_PATTERN = re.compile(r'<[^>]+>')
+CYRILLIC_PATTERN = re.compile(r'[А-Яа-я]')
+SIZE_PATTERN = re.compile(r'(\d+(?:[,\.]\d+)?)\s*(?:кв\.?\s*м|м2|m2)', re.I)
+INFO_DIV_PATTERN = re.compile(r'<div class="info">(.*?)</div>', re.DOTALL)
+FLOOR_STRUCTURED_PATTERN = re.compile(r'Етаж\s*\n\s*(\d{1,2})\b', re.I)
+FLOOR_TEXT_PATTERN = re.compile(r'(?:ет\.\s*|етаж\s+)(\d{1,2})(?!\d)', re.I)
+FLOOR_NA_PATTERN = re.compile(r'на\s+(\d{1,2})\s*[/\(].*?етаж', re.I)
+FLOOR_ORDINAL_PATTERN = re.compile(r'(\d{1,2})\s*[-–]?\s*(?:ия|ти|ен|ри|ви)\s*етаж', re.I)
+FLOOR_INFO_PATTERN = re.compile(r'ет\.\s*(\d{1,2})(?!\d)', re.I)
+ROOMS_PATTERN = re.compile(r'(\d+)\s*(?:-?стаен|стаи|стая)', re.I)
+PARTIAL_PATTERN = re.compile(r'¼|½|¾|⅓|⅔|\d+/\d+\s*(?:ид|ід)|идеална\s*част|ідеална\s*част', re.I)
 
 def log(msg):
     print(msg)
     sys.stdout.flush()
 
+# One keep-alive session per worker thread (requests.Session is not thread-safe)
+_thread_local = threading.local()
+
+def get_session():
+    session = getattr(_thread_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        session.headers.update(HEADERS)
+        _thread_local.session = session
+    return session
+
 def fetch_url(url, retries=0):
     try:
-        req = urllib.request.Request(url, headers={
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-        })
-        with urllib.request.urlopen(req, timeout=REQUEST_TIMEOUT) as resp:
-            return resp.read().decode('utf-8')
+        resp = get_session().get(url, timeout=REQUEST_TIMEOUT)
+        resp.raise_for_status()
+        return resp.content.decode('utf-8')
     except Exception as e:
         if retries < MAX_RETRIES:
             time.sleep(1)
@@ -75,10 +130,16 @@ def extract_property_ids_from_listing(court_id):
     html_content = fetch_url(url)
     if not html_content:
         return []
-    ids = re.findall(r'href="/properties/(\d+)"', html_content)
+    ids = PROPERTY_ID_PATTERN.findall(html_content)
     return list(set(int(id) for id in ids))
 
 
+def fetch_all_listing_ids():
+    """Fetch every court's listing page concurrently. Returns {court_id: ids} in COURTS order."""
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        return dict(zip(COURTS, executor.map(extract_property_ids_from_listing, COURTS)))
+
+
 def parse_property_detail(html_content, prop_id):
     if not html_content:
         return None
@@ -90,9 +151,10 @@ def parse_property_detail(html_content, prop_id):
     }
     
     # Price
-    price_match = re.search(r'<div class="price">([\d\s&;nbsp\.]+)\s*(EUR|лв)', html_content)
+    price_match = PRICE_PATTERN.search(html_content)
     if price_match:
-        price_str = re.sub(r'&nbsp;|\s', '', price_match.group(1))
+        # Drop &nbsp; entities and any whitespace (split() covers all Unicode spaces, like \s)
+        price_str = ''.join(price_match.group(1).replace('&nbsp;', '').split())
         try:
             price = float(price_str)
             if 'лв' in price_match.group(2):
@@ -103,40 +165,34 @@ def parse_property_detail(html_content, prop_id):
     
     # Property type - look after </ul> to skip dropdown options
     # The property type appears in the detail section, after the search form
-    type_match = re.search(r'</ul>\s*</div>\s*<div class="title">([^<]+)</div>\s*<div class="date">', html_content, re.DOTALL)
+    type_match = TYPE_PATTERN.search(html_content)
     if type_match:
         data['property_type'] = sanitize_text(type_match.group(1).strip(), "property_type")
     else:
         # Fallback: look for property type near "Публикувано"
-        type_match = re.search(r'<div class="title">([^<]*(?:апартамент|къща|гараж|вила|парцел|земя|магазин|офис|ателие|склад|земеделска)[^<]*)</div>\s*<div class="(?:date|category)">', html_content, re.I)
+        type_match = TYPE_FALLBACK_PATTERN.search(html_content)
         if type_match:
             data['property_type'] = sanitize_text(type_match.group(1).strip(), "property_type")
     
     # City
-    city_match = re.search(r'(гр\.\s*[А-Яа-я\s-]+|с\.\s*[А-Яа-я\s-]+)', html_content)
+    city_match = CITY_PATTERN.search(html_content)
     if city_match:
         data['city'] = sanitize_text(city_match.group(1).strip().rstrip(',').rstrip('<'), "city")
     
     # District/Район - structured field from BCPEA (e.g. "Район" → "Овча купел")
-    district_match = re.search(
-        r'<div[^>]*class="label"[^>]*>\s*Район\s*</div>\s*<div[^>]*class="info"[^>]*>(.*?)</div>',
-        html_content, re.DOTALL | re.IGNORECASE
-    )
+    district_match = DISTRICT_PATTERN.search(html_content)
     if district_match:
-        district_raw = re.sub(r'<[^>]+>', '', district_match.group(1))
+        district_raw = TAG_PATTERN.sub('', district_match.group(1))
         district_raw = html.unescape(district_raw).strip()
-        if re.search(r'[А-Яа-я]', district_raw) and len(district_raw) > 2:
+        if CYRILLIC_PATTERN.search(district_raw) and len(district_raw) > 2:
             data['neighborhood'] = sanitize_text(district_raw.lower(), "neighborhood")
 
     # Address - extract from <div class="label">Адрес</div><div class="info">...</div> pattern
-    addr_match = re.search(
-        r'<div[^>]*class="label"[^>]*>\s*Адрес\s*</div>\s*<div[^>]*class="info"[^>]*>(.*?)</div>',
-        html_content, re.DOTALL | re.IGNORECASE
-    )
+    addr_match = ADDRESS_PATTERN.search(html_content)
     if addr_match:
-        addr_raw = re.sub(r'<[^>]+>', '', addr_match.group(1))  # strip inner tags
+        addr_raw = TAG_PATTERN.sub('', addr_match.group(1))  # strip inner tags
         addr_raw = html.unescape(addr_raw).strip()
-        if re.search(r'[А-Яа-я]', addr_raw) and len(addr_raw) > 3:
+        if CYRILLIC_PATTERN.search(addr_raw) and len(addr_raw) > 3:
             data['address'] = sanitize_text(addr_raw, "address")
         else:
             data['address'] = None
@@ -144,7 +200,7 @@ def parse_property_detail(html_content, prop_id):
         data['address'] = None
     
     # Size
-    size_match = re.search(r'(\d+(?:[,\.]\d+)?)\s*(?:кв\.?\s*м|м2|m2)', html_content, re.I)
+    size_match = SIZE_PATTERN.search(html_content)
     if size_match:
         data['size_sqm'] = float(size_match.group(1).replace(',', '.'))
     
@@ -152,7 +208,7 @@ def parse_property_detail(html_content, prop_id):
     floor_val = None
 
     # Pattern 1: structured detail block "Етаж\n1" (property details section)
-    structured_match = re.search(r'Етаж\s*\n\s*(\d{1,2})\b', html_content, re.I)
+    structured_match = FLOOR_STRUCTURED_PATTERN.search(html_content)
     if structured_match:
         v = int(structured_match.group(1))
         if 0 <= v <= 30:
@@ -160,9 +216,9 @@ def parse_property_detail(html_content, prop_id):
 
     # Pattern 2: "ет. X" or "етаж X" in address/description text
     if floor_val is None:
-        desc_section = re.search(r'<div class="info">(.*?)</div>', html_content, re.DOTALL)
+        desc_section = INFO_DIV_PATTERN.search(html_content)
         search_text = desc_section.group(1) if desc_section else html_content
-        floor_match = re.search(r'(?:ет\.\s*|етаж\s+)(\d{1,2})(?!\d)', search_text, re.I)
+        floor_match = FLOOR_TEXT_PATTERN.search(search_text)
         if floor_match:
             v = int(floor_match.group(1))
             if 0 <= v <= 30:
@@ -170,7 +226,7 @@ def parse_property_detail(html_content, prop_id):
 
     # Pattern 3: "на X /...) етаж" in full description (Bulgarian ordinal style)
     if floor_val is None:
-        floor_match = re.search(r'на\s+(\d{1,2})\s*[/\(].*?етаж', html_content, re.I)
+        floor_match = FLOOR_NA_PATTERN.search(html_content)
         if floor_match:
             v = int(floor_match.group(1))
             if 0 <= v <= 30:
@@ -178,7 +234,7 @@ def parse_property_detail(html_content, prop_id):
 
     # Pattern 4: "X-ия етаж" or "X-ти етаж" or "X-ен етаж"
     if floor_val is None:
-        floor_match = re.search(r'(\d{1,2})\s*[-–]?\s*(?:ия|ти|ен|ри|ви)\s*етаж', html_content, re.I)
+        floor_match = FLOOR_ORDINAL_PATTERN.search(html_content)
         if floor_match:
             v = int(floor_match.group(1))
             if 0 <= v <= 30:
@@ -186,9 +242,9 @@ def parse_property_detail(html_content, prop_id):
 
     # Pattern 5: ", ет. X," in any info div (address lines)
     if floor_val is None:
-        all_info = re.findall(r'<div class="info">(.*?)</div>', html_content, re.DOTALL)
+        all_info = INFO_DIV_PATTERN.findall(html_content)
         for info_block in all_info:
-            m = re.search(r'ет\.\s*(\d{1,2})(?!\d)', info_block, re.I)
+            m = FLOOR_INFO_PATTERN.search(info_block)
             if m:
                 v = int(m.group(1))
                 if 0 <= v <= 30:
@@ -198,7 +254,7 @@ def parse_property_detail(html_content, prop_id):
     if floor_val is not None:
         data['floor'] = floor_val
     # Rooms
-    rooms_match = re.search(r'(\d+)\s*(?:-?стаен|стаи|стая)', html_content, re.I)
+    rooms_match = ROOMS_PATTERN.search(html_content)
     if rooms_match:
         data['rooms'] = int(rooms_match.group(1))
     
@@ -226,10 +282,7 @@ def parse_property_detail(html_content, prop_id):
             data['is_expired'] = False
     
     # Partial ownership
-    data['is_partial_ownership'] = bool(re.search(
-        r'¼|½|¾|⅓|⅔|\d+/\d+\s*(?:ид|ід)|идеална\s*част|ідеална\s*част', 
-        html_content, re.I
-    ))
+    data['is_partial_ownership'] = bool(PARTIAL_PATTERN.search(html_content))
     
     return data
 
@@ -243,9 +296,7 @@ def fetch_property_detail(prop_id):
 
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH, timeout=30)
-    conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("PRAGMA busy_timeout=30000")
+    conn = connect(DB_PATH, timeout=30)
     conn.execute("""
         CREATE TABLE IF NOT EXISTS auctions (
             id INTEGER PRIMARY KEY,
@@ -272,6 +323,46 @@ def init_db():
     return conn
 
 
+# Secondary indexes are built after the bulk load rather than maintained per insert.
+# Every reader (scans, export_deals, geocoding) filters on is_expired = 0, often by city.
+SECONDARY_INDEXES = {
+    'idx_auctions_active': 'auctions(is_expired, city)',
+}
+
+def drop_indexes(conn):
+    for name in SECONDARY_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.commit()
+
+def create_indexes(conn):
+    """Build any missing secondary indexes; returns True if one was created."""
+    existing = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'auctions'")}
+    missing = [name for name in SECONDARY_INDEXES if name not in existing]
+    for name in missing:
+        conn.execute(f"CREATE INDEX {name} ON {SECONDARY_INDEXES[name]}")
+    conn.commit()
+    return bool(missing)
+
+def analyze(conn):
+    conn.execute("ANALYZE auctions")  # refresh planner stats (full table scan)
+    conn.commit()
+
+
+def save_auction_batch(conn, rows):
+    """Upsert a batch in one executemany; on a DB error retry row by row so only bad rows are lost."""
+    try:
+        conn.executemany(UPSERT_AUCTION_SQL, rows)
+    except sqlite3.Error as e:
+        log(f"  Batch write failed ({e}), retrying {len(rows)} rows one by one")
+        for row in rows:
+            try:
+                conn.execute(UPSERT_AUCTION_SQL, row)
+            except sqlite3.Error as e:
+                log(f"  DB error for property {row[0]}: {e}")
+    conn.commit()
+
+
 def run_full_scan():
     log("=== КЧСИ Scraper v6 - Full Scan ===")
     log(f"Started: {datetime.utcnow().isoformat()}")
@@ -280,11 +371,10 @@ def run_full_scan():
     log("\nStep 1: Collecting property IDs...")
     all_ids = set()
     
-    for court_id, court_name in COURTS.items():
-        ids = extract_property_ids_from_listing(court_id)
+    for court_id, ids in fetch_all_listing_ids().items():
         all_ids.update(ids)
         if ids:
-            log(f"  Court {court_id} ({court_name}): {len(ids)}")
+            log(f"  Court {court_id} ({COURTS[court_id]}): {len(ids)}")
     
     log(f"\nTotal: {len(all_ids)} properties")
     
@@ -294,11 +384,13 @@ def run_full_scan():
     cursor = conn.cursor()
     cursor.execute("DELETE FROM auctions")
     conn.commit()
+    drop_indexes(conn)
     
     now = datetime.utcnow().isoformat()
     fetched = 0
     active = 0
     
+    pending = []
     with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
         futures = {executor.submit(fetch_property_detail, pid): pid for pid in all_ids}
         
@@ -310,51 +402,49 @@ def run_full_scan():
                     if not data.get('is_expired'):
                         active += 1
                     
-                    with _db_lock:
-                        cursor.execute("""
-                            INSERT INTO auctions 
-                            (id, url, price_eur, city, neighborhood, address, property_type, size_sqm, rooms, floor,
-                             is_partial_ownership, is_expired, auction_end, scraped_at, first_seen_at, last_updated_at)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                            ON CONFLICT(id) DO UPDATE SET
-                                url=excluded.url, price_eur=excluded.price_eur, city=excluded.city,
-                                neighborhood=excluded.neighborhood, address=excluded.address,
-                                property_type=excluded.property_type, size_sqm=excluded.size_sqm,
-                                rooms=excluded.rooms, floor=excluded.floor,
-                                is_partial_ownership=excluded.is_partial_ownership,
-                                is_expired=excluded.is_expired, auction_end=excluded.auction_end,
-                                scraped_at=excluded.scraped_at, last_updated_at=excluded.last_updated_at
-                        """, (
-                            data['id'], data.get('url'), data.get('price_eur'), data.get('city'),
-                            data.get('neighborhood'), data.get('address'), data.get('property_type'), data.get('size_sqm'),
-                            data.get('rooms'), data.get('floor'), int(data.get('is_partial_ownership', False)),
-                            int(data.get('is_expired', False)), data.get('auction_end'), now, now, now
-                        ))
-                        
-                        # Commit every 50 records
-                        if fetched % 50 == 0:
-                            conn.commit()
+                    pending.append((
+                        data['id'], data.get('url'), data.get('price_eur'), data.get('city'),
+                        data.get('neighborhood'), data.get('address'), data.get('property_type'), data.get('size_sqm'),
+                        data.get('rooms'), data.get('floor'), int(data.get('is_partial_ownership', False)),
+                        int(data.get('is_expired', False)), data.get('auction_end'), now, now, now
+                    ))
+                    
+                    # Write and commit in batches of DB_BATCH_SIZE records
+                    if len(pending) >= DB_BATCH_SIZE:
+                        try:
+                            with _db_lock:
+                                save_auction_batch(conn, pending)
+                        finally:
+                            pending.clear()
                     if fetched % 50 == 0:
                         log(f"  Progress: {fetched}/{len(all_ids)} ({active} active)")
             except Exception as e:
                 log(f"  Error processing property {futures[future]}: {e}")
     
+    if pending:
+        with _db_lock:
+            save_auction_batch(conn, pending)
     conn.commit()
+    create_indexes(conn)
+    analyze(conn)  # after the bulk load
     
     # Summary
     log(f"\n=== Summary ===")
-    cursor.execute("SELECT COUNT(*) FROM auctions WHERE is_expired = 0")
-    log(f"Active: {cursor.fetchone()[0]}")
+    # One pass over active auctions; totals per type and per city are rolled up here
+    by_type, by_city = Counter(), Counter()
+    cursor.execute("SELECT property_type, city, COUNT(*) FROM auctions WHERE is_expired = 0 GROUP BY property_type, city")
+    for prop_type, city, count in cursor:
+        by_type[prop_type] += count
+        by_city[city] += count
+    log(f"Active: {sum(by_type.values())}")
     
-    cursor.execute("SELECT property_type, COUNT(*) FROM auctions WHERE is_expired = 0 GROUP BY property_type ORDER BY COUNT(*) DESC")
     log("\nBy type:")
-    for row in cursor.fetchall():
-        log(f"  {row[0] or 'Unknown'}: {row[1]}")
+    for prop_type, count in by_type.most_common():
+        log(f"  {prop_type or 'Unknown'}: {count}")
     
-    cursor.execute("SELECT city, COUNT(*) FROM auctions WHERE is_expired = 0 GROUP BY city ORDER BY COUNT(*) DESC LIMIT 10")
     log("\nBy city:")
-    for row in cursor.fetchall():
-        log(f"  {row[0] or 'Unknown'}: {row[1]}")
+    for city, count in by_city.most_common(10):
+        log(f"  {city or 'Unknown'}: {count}")
     
     conn.close()
     log(f"\n✓ Saved to {DB_PATH}")
@@ -366,14 +456,13 @@ def run_incremental_scan():
     conn = init_db()
     cursor = conn.cursor()
     
-    cursor.execute("SELECT id FROM auctions WHERE is_expired = 0")
-    existing = set(row[0] for row in cursor.fetchall())
+    existing = {row[0] for row in cursor.execute("SELECT id FROM auctions WHERE is_expired = 0")}
     log(f"Tracking: {len(existing)} active")
     
     # Get current
     current = set()
-    for court_id in COURTS:
-        current.update(extract_property_ids_from_listing(court_id))
+    for ids in fetch_all_listing_ids().values():
+        current.update(ids)
     log(f"Website: {len(current)} properties")
     
     new_ids = current - existing
@@ -382,52 +471,48 @@ def run_incremental_scan():
     
     now = datetime.utcnow().isoformat()
     
-    # Fetch new
+    # Fetch new; rows are collected on this thread and written in one executemany
+    new_rows = []
     if new_ids:
         with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
             for future in as_completed({executor.submit(fetch_property_detail, pid): pid for pid in new_ids}):
                 data = future.result()
                 if data and not data.get('is_expired'):
-                    with _db_lock:
-                        cursor.execute("""
-                            INSERT INTO auctions 
-                            (id, url, price_eur, city, neighborhood, address, property_type, size_sqm, rooms, floor,
-                             is_partial_ownership, is_expired, auction_end, scraped_at, first_seen_at, last_updated_at)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                            ON CONFLICT(id) DO UPDATE SET
-                                url=excluded.url, price_eur=excluded.price_eur, city=excluded.city,
-                                neighborhood=excluded.neighborhood, address=excluded.address,
-                                property_type=excluded.property_type, size_sqm=excluded.size_sqm,
-                                rooms=excluded.rooms, floor=excluded.floor,
-                                is_partial_ownership=excluded.is_partial_ownership,
-                                is_expired=excluded.is_expired, auction_end=excluded.auction_end,
-                                scraped_at=excluded.scraped_at, last_updated_at=excluded.last_updated_at
-                        """, (
-                            data['id'], data.get('url'), data.get('price_eur'), data.get('city'),
-                            data.get('neighborhood'), data.get('address'), data.get('property_type'), data.get('size_sqm'),
-                            data.get('rooms'), data.get('floor'), int(data.get('is_partial_ownership', False)), 0,
-                            data.get('auction_end'), now, now, now
-                        ))
+                    new_rows.append((
+                        data['id'], data.get('url'), data.get('price_eur'), data.get('city'),
+                        data.get('neighborhood'), data.get('address'), data.get('property_type'), data.get('size_sqm'),
+                        data.get('rooms'), data.get('floor'), int(data.get('is_partial_ownership', False)), 0,
+                        data.get('auction_end'), now, now, now
+                    ))
+    if new_rows:
+        cursor.executemany(UPSERT_AUCTION_SQL, new_rows)
     
     # Mark expired — both by website removal AND by passed auction_end date
-    for pid in expired_ids:
-        cursor.execute("UPDATE auctions SET is_expired = 1, last_updated_at = ? WHERE id = ?", (now, pid))
+    cursor.executemany("UPDATE auctions SET is_expired = 1, last_updated_at = ? WHERE id = ?",
+                       [(now, pid) for pid in expired_ids])
     
     # Also expire any auctions whose auction_end date has passed
-    date_expired = 0
-    cursor.execute("SELECT id, auction_end FROM auctions WHERE is_expired = 0 AND auction_end IS NOT NULL")
-    for row in cursor.fetchall():
+    # Stream the candidates and collect ids first; updating rows while the
+    # same SELECT is still stepping through the table is not safe
+    date_expired_ids = []
+    today = datetime.now()
+    for pid, auction_end in cursor.execute("SELECT id, auction_end FROM auctions WHERE is_expired = 0 AND auction_end IS NOT NULL"):
         try:
-            end_date = datetime.strptime(row[1], '%d.%m.%Y')
-            if end_date < datetime.now():
-                cursor.execute("UPDATE auctions SET is_expired = 1, last_updated_at = ? WHERE id = ?", (now, row[0]))
-                date_expired += 1
+            if datetime.strptime(auction_end, '%d.%m.%Y') < today:
+                date_expired_ids.append(pid)
         except (ValueError, TypeError):
             pass
+    cursor.executemany("UPDATE auctions SET is_expired = 1, last_updated_at = ? WHERE id = ?",
+                       [(now, pid) for pid in date_expired_ids])
+    date_expired = len(date_expired_ids)
     if date_expired:
         log(f"Expired by date: {date_expired}")
     
     conn.commit()
+    # Only builds on databases created before the index existed; stats are
+    # refreshed by the full scan, so ANALYZE runs here only for a new index
+    if create_indexes(conn):
+        analyze(conn)
     
     cursor.execute("SELECT COUNT(*) FROM auctions WHERE is_expired = 0")
     log(f"Active now: {cursor.fetchone()[0]}")
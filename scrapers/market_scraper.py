@@ -20,15 +20,27 @@ import re
 import signal
 import sqlite3
 import sys
+import threading
 import time
 import random
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from dataclasses import dataclass
+from functools import partial
 from typing import Optional, List, Dict, Tuple
 
 import requests
 from bs4 import BeautifulSoup
 
+from scraper_db import connect
+
+# Prefer lxml (requirements-full.txt, with the other scraper deps) over html.parser
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
 # Injection hardening (REG-037 / security scan 2026-02-26)
 import sys as _sys, os as _os
 _sys.path.insert(0, _os.path.join(_os.path.dirname(__file__), '..', '..', 'scripts'))
@@ -57,6 +69,8 @@ LOG_DIR = "data/logs"
 CHECKPOINT_DIR = "data"
 DATA_RETENTION_DAYS = 7
 MIN_LISTINGS_PER_SOURCE = 5
+IMOT_MAX_WORKERS = 4  # Concurrent imot.bg listing page fetches per city (keep polite)
+OLX_MAX_WORKERS = 4  # Concurrent OLX district scrapes per city (keep polite)
 
 # Graceful shutdown
 SHUTDOWN_REQUESTED = False
@@ -315,6 +329,21 @@ def create_session() -> requests.Session:
     session.headers.update(headers)
     return session
 
+# requests.Session is not thread-safe: pool workers each get their own
+_thread_local = threading.local()
+
+def get_session() -> requests.Session:
+    session = getattr(_thread_local, 'session', None)
+    if session is None:
+        session = _thread_local.session = create_session()
+    return session
+
+def in_thread_session(fn):
+    """Wrap fn(session, *args) so each pool thread calls it with its own Session."""
+    def run(*args):
+        return fn(get_session(), *args)
+    return run
+
 def fetch_page(session: requests.Session, url: str, encoding: str = 'utf-8', retries: int = 3,
                connect_timeout: int = 15, read_timeout: int = 45) -> Optional[str]:
     """
@@ -359,13 +388,22 @@ def fetch_page(session: requests.Session, url: str, encoding: str = 'utf-8', ret
 # IMOT.BG SCRAPER
 # ============================================================================
 
+# Price and size in one alternation, so each page string is scanned once;
+# the two never overlap (digits end in €/EUR vs. кв.м)
+IMOT_FIELDS_RE = re.compile(r'(?P<price>\d[\d\s]*\d)\s*[€EUR]|(?P<size>\d+)\s*кв\.?\s*м')
+IMOT_ROOMS_RE = re.compile(r'ednostaen|dvustaen|tristaen|chetiristaen|mnogostaen')
+IMOT_ROOMS = {'ednostaen': 1, 'dvustaen': 2, 'tristaen': 3, 'chetiristaen': 4, 'mnogostaen': 4}
+
+# Thousands separators seen in scraped prices ("120 000", "120\xa0000")
+_STRIP_SPACES = str.maketrans('', '', ' \xa0\t')
+
 def scrape_imot_index(session: requests.Session, url: str) -> List[str]:
     html = fetch_page(session, url, encoding='windows-1251')
     if not html:
         return []
 
-    soup = BeautifulSoup(html, 'html.parser')
-    links = []
+    soup = BeautifulSoup(html, HTML_PARSER)
+    links = {}  # insertion-ordered set: O(1) de-dup, keeps first-seen order
     for a in soup.find_all('a', href=True):
         href = a['href']
         if 'obiava' in href and 'prodava' in href and 'apartament' in href:
@@ -373,58 +411,50 @@ def scrape_imot_index(session: requests.Session, url: str) -> List[str]:
                 href = 'https:' + href
             elif href.startswith('/'):
                 href = 'https://www.imot.bg' + href
-            clean_href = href.split('#')[0]
-            if clean_href not in links:
-                links.append(clean_href)
+            links[href.split('#')[0]] = None
 
-    return links[:30]
+    return list(links)[:30]
 
 def parse_imot_listing(session: requests.Session, url: str, city: str) -> Optional[Listing]:
     html = fetch_page(session, url, encoding='windows-1251')
     if not html:
         return None
 
-    soup = BeautifulSoup(html, 'html.parser')
+    soup = BeautifulSoup(html, HTML_PARSER)
 
     try:
+        # Single pass over the page text: price settles on the first value
+        # above 5000, size on the first value within 15-500 m².
         price_eur = None
-        for text in soup.stripped_strings:
-            match = re.search(r'(\d[\d\s]*\d)\s*[€EUR]', text)
-            if match:
-                price_str = match.group(1).replace(' ', '').replace('\xa0', '')
-                if price_str.isdigit():
-                    price_eur = float(price_str)
-                    if price_eur > 5000:
-                        break
-
-        if not price_eur:
-            return None
-
         size_sqm = None
+        price_done = size_done = False
         for text in soup.stripped_strings:
-            match = re.search(r'(\d+)\s*кв\.?\s*м', text)
-            if match:
-                size_sqm = float(match.group(1))
-                if 15 <= size_sqm <= 500:
+            # First price and first size in this string
+            found = {}
+            for match in IMOT_FIELDS_RE.finditer(text):
+                found.setdefault(match.lastgroup, match.group(match.lastgroup))
+                if len(found) == 2:
                     break
+            if not price_done and 'price' in found:
+                price_str = found['price'].translate(_STRIP_SPACES)
+                if price_str.isdigit():
+                    price_eur = float(price_str)
+                    price_done = price_eur > 5000
+            if not size_done and 'size' in found:
+                size_sqm = float(found['size'])
+                size_done = 15 <= size_sqm <= 500
+            if price_done and size_done:
+                break
 
-        if not size_sqm:
+        if not price_eur or not size_sqm:
             return None
 
         price_per_sqm = round(price_eur / size_sqm, 2)
         if not (200 <= price_per_sqm <= 15000):
             return None
 
-        rooms = None
-        url_lower = url.lower()
-        if 'ednostaen' in url_lower:
-            rooms = 1
-        elif 'dvustaen' in url_lower:
-            rooms = 2
-        elif 'tristaen' in url_lower:
-            rooms = 3
-        elif 'chetiristaen' in url_lower or 'mnogostaen' in url_lower:
-            rooms = 4
+        rooms_match = IMOT_ROOMS_RE.search(url.lower())
+        rooms = IMOT_ROOMS[rooms_match.group(0)] if rooms_match else None
 
         # Extract neighborhood from page title or breadcrumb
         neighborhood = None
@@ -448,9 +478,24 @@ def parse_imot_listing(session: requests.Session, url: str, city: str) -> Option
         logging.debug(f"Parse error for {url[:60]}: {e}")
         return None
 
+# Listing fetches run concurrently, but their start times stay spaced like the
+# old sequential loop (0.5-1.5s apart), shared across all workers
+_imot_rate_lock = threading.Lock()
+_imot_next_request = 0.0
+
+def imot_throttle():
+    global _imot_next_request
+    with _imot_rate_lock:
+        now = time.monotonic()
+        wait = _imot_next_request - now
+        _imot_next_request = max(now, _imot_next_request) + 0.5 + random.random()
+    deadline = now + wait
+    while wait > 0 and not SHUTDOWN_REQUESTED:  # wake promptly on shutdown
+        time.sleep(min(wait, 0.2))
+        wait = deadline - time.monotonic()
+
 def scrape_imot_city(session: requests.Session, url: str, city: str) -> Tuple[List[Listing], bool, str]:
     """Returns (listings, success, error_msg)"""
-    listings = []
     urls = scrape_imot_index(session, url)
     if not urls:
         return [], False, "Failed to fetch index page or no listings found"
@@ -458,14 +503,22 @@ def scrape_imot_city(session: requests.Session, url: str, city: str) -> Tuple[Li
     logging.info(f"  imot.bg: found {len(urls)} links, scraping...")
     print(f"found {len(urls)}, scraping...", end=" ", flush=True)
 
-    for listing_url in urls:
+    def fetch_listing(listing_url: str) -> Optional[Listing]:
+        # Check before and after waiting: queued URLs must not sleep through a shutdown
         if SHUTDOWN_REQUESTED:
-            logging.warning("Shutdown requested mid-imot scrape")
-            return listings, False, "Interrupted by shutdown signal"
-        listing = parse_imot_listing(session, listing_url, city)
-        if listing:
-            listings.append(listing)
-        time.sleep(0.5 + random.random())
+            return None
+        imot_throttle()
+        if SHUTDOWN_REQUESTED:
+            return None
+        return parse_imot_listing(get_session(), listing_url, city)
+
+    # Listing pages are independent GETs: overlap their latency, keep index order
+    with ThreadPoolExecutor(max_workers=IMOT_MAX_WORKERS) as executor:
+        listings = [l for l in executor.map(fetch_listing, urls) if l]
+
+    if SHUTDOWN_REQUESTED:
+        logging.warning("Shutdown requested mid-imot scrape")
+        return listings, False, "Interrupted by shutdown signal"
 
     if len(listings) < MIN_LISTINGS_PER_SOURCE:
         return listings, False, f"Too few listings: {len(listings)} < {MIN_LISTINGS_PER_SOURCE}"
@@ -476,6 +529,10 @@ def scrape_imot_city(session: requests.Session, url: str, city: str) -> Tuple[Li
 # OLX.BG SCRAPER
 # ============================================================================
 
+OLX_AREA_PRICE_RE = re.compile(r'(\d+)\s*кв\.м\s*-\s*([\d\.,]+)')  # "65 кв.м - 1846.15"
+OLX_DISTRICT_ID_RE = re.compile(r'district_id%5D=(\d+)')
+OLX_LISTING_COUNT_RE = re.compile(r'\s*\(\d+\)\s*$')
+
 def get_olx_districts(session: requests.Session, city_url: str) -> Dict[str, str]:
     """
     Discover OLX district filter IDs from a city listing page.
@@ -484,15 +541,15 @@ def get_olx_districts(session: requests.Session, city_url: str) -> Dict[str, str
     html = fetch_page(session, city_url)
     if not html:
         return {}
-    soup = BeautifulSoup(html, 'html.parser')
+    soup = BeautifulSoup(html, HTML_PARSER)
     districts = {}
     for a in soup.find_all('a', href=True):
         href = a['href']
-        m = re.search(r'district_id%5D=(\d+)', href)
+        m = OLX_DISTRICT_ID_RE.search(href)
         if m:
             did = m.group(1)
             # Label is the link text, strip listing count in parens
-            label = re.sub(r'\s*\(\d+\)\s*$', '', a.get_text().strip())
+            label = OLX_LISTING_COUNT_RE.sub('', a.get_text().strip())
             if label and did not in districts:
                 districts[did] = label
     return districts
@@ -518,14 +575,14 @@ def scrape_olx_district(session: requests.Session, city_url: str, city: str,
         if not html:
             break
 
-        soup = BeautifulSoup(html, 'html.parser')
-        pattern = re.compile(r'(\d+)\s*кв\.м\s*-\s*([\d\.,]+)')
+        soup = BeautifulSoup(html, HTML_PARSER)
         cards = soup.select('[data-cy="l-card"], .offer-wrapper, article')
 
         items = cards if cards else [soup]  # fallback to full page
+        scraped_at = datetime.utcnow().isoformat()  # one timestamp per fetched page
         for item in items:
             text = item.get_text()
-            match = pattern.search(text)
+            match = OLX_AREA_PRICE_RE.search(text)
             if not match:
                 continue
             try:
@@ -537,8 +594,7 @@ def scrape_olx_district(session: requests.Session, city_url: str, city: str,
                 listings.append(Listing(
                     neighborhood=neighborhood, city=city, size_sqm=size_sqm,
                     price_eur=price_eur, price_per_sqm=price_per_sqm,
-                    rooms=None, source='olx.bg',
-                    scraped_at=datetime.utcnow().isoformat()
+                    rooms=None, source='olx.bg', scraped_at=scraped_at
                 ))
             except (ValueError, TypeError):
                 continue
@@ -567,17 +623,17 @@ def scrape_olx_search(session: requests.Session, city: str,
         if not html:
             break
 
-        soup = BeautifulSoup(html, 'html.parser')
-        pattern = re.compile(r'(\d+)\s*кв\.м\s*-\s*([\d\.,]+)')
+        soup = BeautifulSoup(html, HTML_PARSER)
         cards = soup.select('[data-cy="l-card"], .offer-wrapper, article')
         items = cards if cards else [soup]
+        scraped_at = datetime.utcnow().isoformat()  # one timestamp per fetched page
 
         for item in items:
             text = item.get_text()
             # Skip rental listings: they show monthly prices (very low total EUR amount)
             # Sales listings are always > 10000 EUR; rentals are 200-2000 EUR/month
             # The price_per_sqm filter (200-15000) handles this, but double-check total price
-            match = pattern.search(text)
+            match = OLX_AREA_PRICE_RE.search(text)
             if not match:
                 continue
             try:
@@ -592,8 +648,7 @@ def scrape_olx_search(session: requests.Session, city: str,
                 listings.append(Listing(
                     neighborhood=neighborhood, city=city, size_sqm=size_sqm,
                     price_eur=price_eur, price_per_sqm=price_per_sqm,
-                    rooms=None, source='olx.bg',
-                    scraped_at=datetime.utcnow().isoformat()
+                    rooms=None, source='olx.bg', scraped_at=scraped_at
                 ))
             except (ValueError, TypeError):
                 continue
@@ -619,12 +674,14 @@ def scrape_olx(session: requests.Session, url: str, city: str) -> Tuple[List[Lis
     logging.info(f"  OLX: {len(districts)} districts found for {city}")
     all_listings = []
 
-    for did, dname in districts.items():
-        if SHUTDOWN_REQUESTED:
-            break
-        district_listings = scrape_olx_district(session, url, city, did, dname)
-        all_listings.extend(district_listings)
-        logging.debug(f"    District {dname!r}: {len(district_listings)} listings")
+    # Districts are independent and I/O-bound: fetch them concurrently.
+    # map() keeps results in district order; each worker checks SHUTDOWN_REQUESTED.
+    with ThreadPoolExecutor(max_workers=OLX_MAX_WORKERS) as executor:
+        results = executor.map(partial(in_thread_session(scrape_olx_district), url, city),
+                               districts.keys(), districts.values())
+        for dname, district_listings in zip(districts.values(), results):
+            all_listings.extend(district_listings)
+            logging.debug(f"    District {dname!r}: {len(district_listings)} listings")
 
     # Step 2: supplement with search-based scraping for unlisted neighborhoods
     supplements = OLX_SEARCH_SUPPLEMENTS.get(city, [])
@@ -659,10 +716,10 @@ def _scrape_olx_city_fallback(session: requests.Session, url: str, city: str) ->
             if page == 1:
                 return [], False, "Failed to fetch page 1"
             break
-        soup = BeautifulSoup(html, 'html.parser')
+        soup = BeautifulSoup(html, HTML_PARSER)
         text = soup.get_text()
-        pattern = re.compile(r'(\d+)\s*кв\.м\s*-\s*([\d\.,]+)')
-        for match in pattern.finditer(text):
+        scraped_at = datetime.utcnow().isoformat()  # one timestamp per fetched page
+        for match in OLX_AREA_PRICE_RE.finditer(text):
             try:
                 size_sqm = float(match.group(1))
                 price_per_sqm = float(match.group(2).replace(',', '.'))
@@ -672,7 +729,7 @@ def _scrape_olx_city_fallback(session: requests.Session, url: str, city: str) ->
                     neighborhood=None, city=city, size_sqm=size_sqm,
                     price_eur=round(size_sqm * price_per_sqm, 2),
                     price_per_sqm=price_per_sqm, rooms=None, source='olx.bg',
-                    scraped_at=datetime.utcnow().isoformat()
+                    scraped_at=scraped_at
                 ))
             except (ValueError, TypeError):
                 continue
@@ -686,12 +743,24 @@ def _scrape_olx_city_fallback(session: requests.Session, url: str, city: str) ->
 # DATABASE
 # ============================================================================
 
+# Secondary indexes are dropped before the scrape loop and rebuilt once at the
+# end, so bulk inserts only touch the table B-tree (and the UNIQUE index).
+SECONDARY_INDEXES = {
+    # (city, size_sqm) prefix serves city-only filters and city + size windows;
+    # the trailing columns cover export_deals' comparables load (index-only scan)
+    'idx_city_size_comps': 'market_listings(city, size_sqm, price_per_sqm, neighborhood)',
+    'idx_source': 'market_listings(source)',
+    'idx_size': 'market_listings(size_sqm)',
+    'idx_scraped': 'market_listings(scraped_at)',
+    'idx_neighborhood': 'market_listings(neighborhood)',
+}
+
 def init_db() -> sqlite3.Connection:
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 
-    conn = sqlite3.connect(DB_PATH, timeout=30)
-    conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("PRAGMA busy_timeout=5000")
+    # Autocommit at the driver level; save_listings opens its own BEGIN IMMEDIATE
+    # so the write lock is taken up front instead of upgraded mid-transaction
+    conn = connect(DB_PATH, isolation_level=None)
 
     conn.execute("""
         CREATE TABLE IF NOT EXISTS market_listings (
@@ -707,11 +776,6 @@ def init_db() -> sqlite3.Connection:
             UNIQUE(city, size_sqm, price_eur, source)
         )
     """)
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_city ON market_listings(city)")
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_source ON market_listings(source)")
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_size ON market_listings(size_sqm)")
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_scraped ON market_listings(scraped_at)")
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_neighborhood ON market_listings(neighborhood)")
 
     cutoff = (datetime.utcnow() - timedelta(days=DATA_RETENTION_DAYS)).isoformat()
     cursor = conn.execute("DELETE FROM market_listings WHERE scraped_at < ?", (cutoff,))
@@ -721,41 +785,104 @@ def init_db() -> sqlite3.Connection:
     conn.commit()
     return conn
 
-def save_listings(conn: sqlite3.Connection, listings: List[Listing]) -> int:
-    saved = 0
-    for l in listings:
-        try:
-            conn.execute("""
-                INSERT OR REPLACE INTO market_listings
-                (city, neighborhood, size_sqm, price_eur, price_per_sqm, rooms, source, scraped_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (l.city, l.neighborhood, l.size_sqm, l.price_eur, l.price_per_sqm, l.rooms, l.source, l.scraped_at))
-            saved += 1
-        except sqlite3.Error as e:
-            logging.warning(f"DB insert error: {e}")
+# Superseded by idx_city_size_comps; dropped so existing databases don't keep maintaining them
+LEGACY_INDEXES = ('idx_city', 'idx_city_size')
+
+def drop_indexes(conn: sqlite3.Connection):
+    for name in (*SECONDARY_INDEXES, *LEGACY_INDEXES):
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.commit()
+
+def create_indexes(conn: sqlite3.Connection):
+    """Build any missing secondary indexes (and drop legacy ones); ANALYZE only if one was built."""
+    for name in LEGACY_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    existing = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'market_listings'")}
+    missing = [name for name in SECONDARY_INDEXES if name not in existing]
+    for name in missing:
+        conn.execute(f"CREATE INDEX {name} ON {SECONDARY_INDEXES[name]}")
+    if missing:
+        conn.execute("ANALYZE market_listings")  # refresh planner stats after bulk load
     conn.commit()
-    return saved
+
+# 8 columns per row; stay under SQLite's default 999 bound-parameter limit
+INSERT_BATCH_ROWS = 999 // 8
+_INSERT_ROW = "(?, ?, ?, ?, ?, ?, ?, ?)"
+_INSERT_LISTINGS_SQL = """INSERT OR REPLACE INTO market_listings
+    (city, neighborhood, size_sqm, price_eur, price_per_sqm, rooms, source, scraped_at)
+    VALUES """
+
+def save_listings(conn: sqlite3.Connection, listings: List[Listing]) -> int:
+    before = conn.total_changes
+    conn.execute("BEGIN IMMEDIATE")  # one transaction per city+source
+    try:
+        for i in range(0, len(listings), INSERT_BATCH_ROWS):
+            batch = listings[i:i + INSERT_BATCH_ROWS]
+            rows = [(l.city, l.neighborhood, l.size_sqm, l.price_eur,
+                     l.price_per_sqm, l.rooms, l.source, l.scraped_at) for l in batch]
+            placeholders = ", ".join([_INSERT_ROW] * len(rows))
+            try:
+                conn.execute(_INSERT_LISTINGS_SQL + placeholders, [v for row in rows for v in row])
+            except sqlite3.Error as e:
+                # The failed statement wrote nothing: retry row by row so only bad rows are dropped
+                dropped = 0
+                for row in rows:
+                    try:
+                        conn.execute(_INSERT_LISTINGS_SQL + _INSERT_ROW, row)
+                    except sqlite3.Error:
+                        dropped += 1
+                logging.warning(f"DB insert error: {e}; dropped {dropped}/{len(rows)} rows")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return conn.total_changes - before
+
+# Fields written to market_listings.json, in output order
+_EXPORT_COLUMNS = ('city', 'size_sqm', 'price_eur', 'price_per_sqm', 'rooms', 'source', 'scraped_at')
 
 def export_json(conn: sqlite3.Connection) -> int:
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT city, size_sqm, price_eur, price_per_sqm, rooms, source, scraped_at
+    """Stream market_listings to OUTPUT_JSON row by row (same layout as json.dump indent=2)."""
+    cursor = conn.execute(f"""
+        SELECT {', '.join(_EXPORT_COLUMNS)}
         FROM market_listings
         ORDER BY city, price_per_sqm
     """)
 
-    listings = []
-    for row in cursor.fetchall():
-        listings.append({
-            'city': row[0], 'size_sqm': row[1], 'price_eur': row[2],
-            'price_per_sqm': row[3], 'rooms': row[4], 'source': row[5],
-            'scraped_at': row[6]
-        })
-
+    count = 0
     with open(OUTPUT_JSON, 'w', encoding='utf-8') as f:
-        json.dump(listings, f, ensure_ascii=False, indent=2)
+        f.write('[')
+        for row in cursor:
+            item = json.dumps(dict(zip(_EXPORT_COLUMNS, row)), ensure_ascii=False, indent=2)
+            f.write(',\n  ' if count else '\n  ')
+            f.write(item.replace('\n', '\n  '))
+            count += 1
+        f.write('\n]' if count else ']')
+
+    return count
+
+def print_stats(conn: sqlite3.Connection):
+    """Print listing count and avg price/m² by source and by city from one table scan."""
+    by_source: Dict[str, List[float]] = {}
+    by_city: Dict[str, List[float]] = {}
+    for source, city, count, total in conn.execute("""
+        SELECT source, city, COUNT(*), SUM(price_per_sqm)
+        FROM market_listings WHERE price_per_sqm IS NOT NULL
+        GROUP BY source, city
+    """):
+        for bucket, key in ((by_source, source), (by_city, city)):
+            acc = bucket.setdefault(key, [0, 0.0])
+            acc[0] += count
+            acc[1] += total
 
-    return len(listings)
+    print("\nBy source:")
+    for source, (count, total) in sorted(by_source.items()):
+        print(f"  {source}: {count} listings, avg €{round(total / count, 0)}/m²")
+
+    print("\nBy city:")
+    for city, (count, total) in sorted(by_city.items(), key=lambda kv: -kv[1][0]):
+        print(f"  {city}: {count} listings, avg €{round(total / count, 0)}/m²")
 
 # ============================================================================
 # MAIN
@@ -788,6 +915,7 @@ def main():
                     sys.exit(1)
                 # Just need to export
                 conn = init_db()
+                create_indexes(conn)
                 exported = export_json(conn)
                 conn.close()
                 print(f"📤 Exported {exported} to {OUTPUT_JSON}")
@@ -802,73 +930,92 @@ def main():
             print("🗑️  Cleared existing checkpoint (fresh run)")
 
     conn = init_db()
+    # Deferring index maintenance only pays off when loading into an empty table;
+    # market_listings normally keeps a week of rows, so inserts maintain the indexes
+    bulk_load = conn.execute("SELECT 1 FROM market_listings LIMIT 1").fetchone() is None
+    if bulk_load:
+        drop_indexes(conn)
+    else:
+        create_indexes(conn)
     session = create_session()
 
     total = 0
     cities_completed = 0
     interrupted = False
 
-    for city, urls in CITIES.items():
-        if SHUTDOWN_REQUESTED:
-            logging.warning(f"Shutdown requested, stopping after {cities_completed} cities")
-            print(f"\n⚠️  Shutdown after {cities_completed}/{len(CITIES)} cities")
-            interrupted = True
-            break
-
-        print(f"\n📍 {city}")
-
-        # === IMOT.BG ===
-        if checkpoint.is_done(city, 'imot.bg'):
-            prev = checkpoint.get_result(city, 'imot.bg')
-            status = "✓" if prev['success'] else "✗"
-            print(f"  ⏭️  imot.bg: skipped (checkpoint: {status} {prev['count']} listings)")
-        else:
-            print(f"  🔍 imot.bg... ", end="", flush=True)
-            listings, success, error = scrape_imot_city(session, urls['imot'], city)
-
-            if SHUTDOWN_REQUESTED and not success:
-                # Interrupted mid-scrape - save what we got to DB but don't mark complete
-                if listings:
-                    save_listings(conn, listings)
-                    print(f"💾 {len(listings)} saved (interrupted, will retry)")
-                else:
-                    print("interrupted")
+    scrape_ok = False
+    try:
+        for city, urls in CITIES.items():
+            if SHUTDOWN_REQUESTED:
+                logging.warning(f"Shutdown requested, stopping after {cities_completed} cities")
+                print(f"\n⚠️  Shutdown after {cities_completed}/{len(CITIES)} cities")
                 interrupted = True
                 break
 
-            saved = save_listings(conn, listings)
-            checkpoint.mark_done(city, 'imot.bg', success, len(listings), error)
-            print(f"{'✓' if success else '✗'} {len(listings)} → {saved} saved")
-            total += saved
-
-        if SHUTDOWN_REQUESTED:
-            interrupted = True
-            break
+            print(f"\n📍 {city}")
+
+            # === IMOT.BG ===
+            if checkpoint.is_done(city, 'imot.bg'):
+                prev = checkpoint.get_result(city, 'imot.bg')
+                status = "✓" if prev['success'] else "✗"
+                print(f"  ⏭️  imot.bg: skipped (checkpoint: {status} {prev['count']} listings)")
+            else:
+                print(f"  🔍 imot.bg... ", end="", flush=True)
+                listings, success, error = scrape_imot_city(session, urls['imot'], city)
+
+                if SHUTDOWN_REQUESTED and not success:
+                    # Interrupted mid-scrape - save what we got to DB but don't mark complete
+                    if listings:
+                        save_listings(conn, listings)
+                        print(f"💾 {len(listings)} saved (interrupted, will retry)")
+                    else:
+                        print("interrupted")
+                    interrupted = True
+                    break
 
-        # === OLX.BG ===
-        if checkpoint.is_done(city, 'olx.bg'):
-            prev = checkpoint.get_result(city, 'olx.bg')
-            status = "✓" if prev['success'] else "✗"
-            print(f"  ⏭️  olx.bg: skipped (checkpoint: {status} {prev['count']} listings)")
-        else:
-            print(f"  🔍 olx.bg... ", end="", flush=True)
-            listings, success, error = scrape_olx(session, urls['olx'], city)
+                saved = save_listings(conn, listings)
+                checkpoint.mark_done(city, 'imot.bg', success, len(listings), error)
+                print(f"{'✓' if success else '✗'} {len(listings)} → {saved} saved")
+                total += saved
 
-            if SHUTDOWN_REQUESTED and not success:
-                if listings:
-                    save_listings(conn, listings)
-                    print(f"💾 {len(listings)} saved (interrupted, will retry)")
-                else:
-                    print("interrupted")
+            if SHUTDOWN_REQUESTED:
                 interrupted = True
                 break
 
-            saved = save_listings(conn, listings)
-            checkpoint.mark_done(city, 'olx.bg', success, len(listings), error)
-            print(f"{'✓' if success else '✗'} {len(listings)} → {saved} saved")
-            total += saved
+            # === OLX.BG ===
+            if checkpoint.is_done(city, 'olx.bg'):
+                prev = checkpoint.get_result(city, 'olx.bg')
+                status = "✓" if prev['success'] else "✗"
+                print(f"  ⏭️  olx.bg: skipped (checkpoint: {status} {prev['count']} listings)")
+            else:
+                print(f"  🔍 olx.bg... ", end="", flush=True)
+                listings, success, error = scrape_olx(session, urls['olx'], city)
+
+                if SHUTDOWN_REQUESTED and not success:
+                    if listings:
+                        save_listings(conn, listings)
+                        print(f"💾 {len(listings)} saved (interrupted, will retry)")
+                    else:
+                        print("interrupted")
+                    interrupted = True
+                    break
 
-        cities_completed += 1
+                saved = save_listings(conn, listings)
+                checkpoint.mark_done(city, 'olx.bg', success, len(listings), error)
+                print(f"{'✓' if success else '✗'} {len(listings)} → {saved} saved")
+                total += saved
+
+            cities_completed += 1
+        scrape_ok = True
+    finally:
+        if bulk_load:
+            # Rebuild indexes once, after all inserts (also on interrupt or error)
+            try:
+                create_indexes(conn)
+            except sqlite3.Error as e:
+                if scrape_ok:
+                    raise
+                logging.error(f"Index rebuild failed after scrape error: {e}")  # don't mask the original
 
     # === RESULTS ===
     print("\n" + "=" * 60)
@@ -881,23 +1028,7 @@ def main():
     print("📊 DATABASE STATISTICS")
     print("=" * 60)
 
-    cursor = conn.cursor()
-
-    print("\nBy source:")
-    for row in cursor.execute("""
-        SELECT source, COUNT(*), ROUND(AVG(price_per_sqm), 0)
-        FROM market_listings WHERE price_per_sqm IS NOT NULL
-        GROUP BY source
-    """):
-        print(f"  {row[0]}: {row[1]} listings, avg €{row[2]}/m²")
-
-    print("\nBy city:")
-    for row in cursor.execute("""
-        SELECT city, COUNT(*), ROUND(AVG(price_per_sqm), 0)
-        FROM market_listings WHERE price_per_sqm IS NOT NULL
-        GROUP BY city ORDER BY COUNT(*) DESC
-    """):
-        print(f"  {row[0]}: {row[1]} listings, avg €{row[2]}/m²")
+    print_stats(conn)
 
     # === FINAL VERDICT ===
     print(f"\n{'=' * 60}")
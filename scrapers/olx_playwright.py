@@ -5,13 +5,15 @@ OLX Playwright Scraper v2 - Fixed parsing
 """
 
 import re
-import sqlite3
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dataclasses import dataclass
 from typing import Optional, List
 
+from scraper_db import connect
+
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 try:
     from security.scraper_sanitize import sanitize_text
@@ -26,6 +28,18 @@ except ImportError:
     sys.exit(1)
 
 DB_PATH = "data/market.db"
+MAX_WORKERS = 3  # Concurrent cities, one headless Chromium each
+BLOCKED_RESOURCE_TYPES = {'image', 'media', 'font'}
+
+# Thousands separators seen in scraped prices ("120 000", "120\xa0000")
+_STRIP_SPACES = str.maketrans('', '', ' \xa0\t')
+
+# Card text patterns, compiled once
+_EUR_RE = re.compile(r'(\d[\d\s]*)\s*€')                 # "247071 €" or "/ 247071 €"
+_SIZE_RE = re.compile(r'(\d+)\s*кв\.?м')                   # "150 кв.м" or "150 кв.м - 1647"
+_LOC_RE = re.compile(r'гр\.\s*\S+,\s*([^-]+?)\s*-')        # "гр. София, Лозенец - ..."
+_WORD_ROOMS = {'едностаен': 1, 'двустаен': 2, 'тристаен': 3, 'четиристаен': 4, 'многостаен': 5}
+_ROOMS_RE = re.compile(r'(\d)-?стаен|(\d)-?стаи|Едностаен|Двустаен|Тристаен|Четиристаен|Многостаен', re.I)
 
 CITIES = {
     'София': 'https://www.olx.bg/nedvizhimi-imoti/prodazhbi/apartamenti/sofiya/',
@@ -49,54 +63,61 @@ class Listing:
 
 def init_db():
     os.makedirs(os.path.dirname(DB_PATH) if os.path.dirname(DB_PATH) else '.', exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect(DB_PATH)
     c = conn.cursor()
     c.execute('''
         CREATE TABLE IF NOT EXISTS market_listings (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             city TEXT NOT NULL, neighborhood TEXT, size_sqm REAL NOT NULL,
             price_eur REAL NOT NULL, price_per_sqm REAL NOT NULL,
-            rooms INTEGER, source TEXT NOT NULL, scraped_at TEXT NOT NULL
+            rooms INTEGER, source TEXT NOT NULL, scraped_at TEXT NOT NULL,
+            UNIQUE(city, size_sqm, price_eur, source)
         )
     ''')
-    c.execute('CREATE INDEX IF NOT EXISTS idx_city ON market_listings(city)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_city_size_comps ON market_listings(city, size_sqm, price_per_sqm, neighborhood)')
     c.execute('CREATE INDEX IF NOT EXISTS idx_source ON market_listings(source)')
     conn.commit()
     return conn
 
 def save_listings(conn, listings):
-    c = conn.cursor()
-    for l in listings:
-        c.execute('''INSERT OR REPLACE INTO market_listings 
+    rows = [(l.city, l.neighborhood, l.size_sqm, l.price_eur, l.price_per_sqm, l.rooms, l.source, l.scraped_at)
+            for l in listings]
+    before = conn.total_changes
+    with conn:  # one transaction per city
+        conn.executemany('''INSERT OR REPLACE INTO market_listings 
             (city, neighborhood, size_sqm, price_eur, price_per_sqm, rooms, source, scraped_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-            (l.city, l.neighborhood, l.size_sqm, l.price_eur, l.price_per_sqm, l.rooms, l.source, l.scraped_at))
-    conn.commit()
-    return len(listings)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+    return conn.total_changes - before
 
 def scrape_olx_city(page, city, url):
     listings = []
     try:
-        page.goto(url, wait_until='networkidle', timeout=60000)
+        # Cards are awaited explicitly below, so no need to wait for network idle
+        page.goto(url, wait_until='domcontentloaded', timeout=60000)
         page.wait_for_selector('[data-cy="l-card"]', timeout=30000)
-        cards = page.query_selector_all('[data-cy="l-card"]')
-        print(f"found {len(cards)} cards", end="", flush=True)
+        # One round-trip for all card texts instead of inner_text() per card
+        texts = page.evaluate(
+            "() => Array.from(document.querySelectorAll('[data-cy=\"l-card\"]'), c => c.innerText)")
+        print(f"  {city}: found {len(texts)} cards", flush=True)
         
-        for card in cards[:60]:
+        # Hot loop: bind the bound methods once
+        eur_search, size_search = _EUR_RE.search, _SIZE_RE.search
+        loc_search, rooms_search = _LOC_RE.search, _ROOMS_RE.search
+        append = listings.append
+        scraped_at = datetime.utcnow().isoformat()  # one timestamp per city page
+        for text in texts[:60]:
             try:
-                text = card.inner_text()
-                
                 # Extract EUR price - pattern: "247071 €" or "/ 247071 €"
-                eur_match = re.search(r'(\d[\d\s]*)\s*€', text)
+                eur_match = eur_search(text)
                 if not eur_match:
                     continue
-                price_str = eur_match.group(1).replace(' ', '').replace('\xa0', '')
+                price_str = eur_match.group(1).translate(_STRIP_SPACES)
                 price_eur = float(price_str)
                 if price_eur < 10000 or price_eur > 2000000:
                     continue
                 
                 # Extract size - pattern: "150 кв.м" or "150 кв.м - 1647"
-                size_match = re.search(r'(\d+)\s*кв\.?м', text)
+                size_match = size_search(text)
                 if not size_match:
                     continue
                 size_sqm = float(size_match.group(1))
@@ -105,40 +126,56 @@ def scrape_olx_city(page, city, url):
                 
                 # Neighborhood from location
                 neighborhood = None
-                loc_match = re.search(r'гр\.\s*\S+,\s*([^-]+?)\s*-', text)
+                loc_match = loc_search(text)
                 if loc_match:
                     neighborhood = sanitize_text(loc_match.group(1).strip(), "neighborhood")
                 
                 # Rooms from title
                 rooms = None
-                rooms_match = re.search(r'(\d)-?стаен|(\d)-?стаи|Едностаен|Двустаен|Тристаен|Четиристаен|Многостаен', text, re.I)
+                rooms_match = rooms_search(text)
                 if rooms_match:
                     if rooms_match.group(1):
                         rooms = int(rooms_match.group(1))
                     elif rooms_match.group(2):
                         rooms = int(rooms_match.group(2))
-                    elif 'Едностаен' in text:
-                        rooms = 1
-                    elif 'Двустаен' in text:
-                        rooms = 2
-                    elif 'Тристаен' in text:
-                        rooms = 3
-                    elif 'Четиристаен' in text:
-                        rooms = 4
-                    elif 'Многостаен' in text:
-                        rooms = 5
+                    else:
+                        rooms = _WORD_ROOMS.get(rooms_match.group(0).lower())
                 
-                listings.append(Listing(
+                append(Listing(
                     city=city, neighborhood=neighborhood, size_sqm=size_sqm,
                     price_eur=round(price_eur, 2), price_per_sqm=round(price_eur / size_sqm, 2),
-                    rooms=rooms, source='olx.bg', scraped_at=datetime.utcnow().isoformat()
+                    rooms=rooms, source='olx.bg', scraped_at=scraped_at
                 ))
             except (ValueError, TypeError, AttributeError):
                 continue
     except Exception as e:
-        print(f" ERROR: {e}", end="")
+        print(f"  {city}: ERROR: {e}", flush=True)
     return listings
 
+def open_page(p):
+    """Launch a headless browser and return (browser, page) ready for OLX."""
+    browser = p.chromium.launch(headless=True, args=['--no-sandbox', '--disable-dev-shm-usage'])
+    context = browser.new_context(
+        viewport={'width': 1920, 'height': 1080},
+        user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
+        locale='bg-BG',
+    )
+    # Only card text is read: skip heavy assets (stylesheets stay, innerText depends on them)
+    context.route("**/*", lambda route: route.abort()
+                  if route.request.resource_type in BLOCKED_RESOURCE_TYPES else route.continue_())
+    page = context.new_page()
+    page.add_init_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined});")
+    return browser, page
+
+def scrape_city_isolated(city, url):
+    """Scrape one city in its own Playwright instance (sync API objects are thread-bound)."""
+    with sync_playwright() as p:
+        browser, page = open_page(p)
+        try:
+            return scrape_olx_city(page, city, url)
+        finally:
+            browser.close()
+
 def main():
     print(f"🏠 OLX Playwright Scraper v2")
     print(f"⏰ {datetime.now().isoformat()}")
@@ -152,28 +189,20 @@ def main():
     
     total = []
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True, args=['--no-sandbox', '--disable-dev-shm-usage'])
-        context = browser.new_context(
-            viewport={'width': 1920, 'height': 1080},
-            user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
-            locale='bg-BG',
-        )
-        page = context.new_page()
-        page.add_init_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined});")
-        
-        for city, url in CITIES.items():
+    print(f"  🔍 olx.bg: {len(CITIES)} cities, {MAX_WORKERS} at a time...", flush=True)
+    
+    # Scrape cities in parallel; results come back in CITIES order and are saved here
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        results = executor.map(lambda item: scrape_city_isolated(*item), CITIES.items())
+        for city, listings in zip(CITIES, results):
             print(f"\n📍 {city}")
-            print(f"  🔍 olx.bg... ", end="", flush=True)
-            listings = scrape_olx_city(page, city, url)
             if listings:
                 saved = save_listings(conn, listings)
-                print(f" → saved {saved}")
+                print(f"  olx.bg: {len(listings)} → saved {saved}")
                 total.extend(listings)
             else:
-                print(" → 0 found")
-        
-        browser.close()
+                print("  olx.bg: 0 found")
+    
     conn.close()
     print(f"\n{'=' * 60}")
     print(f"✅ Total: {len(total)} OLX listings scraped")
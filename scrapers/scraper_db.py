@@ -0,0 +1,18 @@
+"""
+Shared SQLite connection setup for the scrapers.
+"""
+
+import sqlite3
+
+
+def connect(path, timeout=5.0, **kwargs):
+    """Open a scraper write connection: WAL, relaxed fsync, 64 MB page cache.
+
+    timeout is the busy timeout in seconds; extra kwargs go to sqlite3.connect.
+    """
+    conn = sqlite3.connect(path, timeout=timeout, **kwargs)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")   # safe with WAL, no fsync per commit
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")    # 64 MB page cache
+    return conn
@@ -12,13 +12,12 @@ import re
 import html
 import time
 import urllib.request
-import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
 DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'auctions.db')
-_db_lock = threading.Lock()
+COMMIT_EVERY = 500  # Address updates per executemany + commit
 
 
 def extract_address_from_html(html_content: str) -> str | None:
@@ -61,7 +60,6 @@ def main():
         ORDER BY id
     """).fetchall()
 
-    db.close()
     total = len(rows)
     print(f"Auctions with missing/bad address: {total}")
     print("Re-fetching from BCPEA...\n")
@@ -69,6 +67,13 @@ def main():
     updated = 0
     found = 0
     errors = 0
+    pending = []
+
+    def flush():
+        # Results are consumed on the main thread, so the one connection is enough
+        db.executemany("UPDATE auctions SET address = ? WHERE id = ?", pending)
+        db.commit()
+        pending.clear()
 
     with ThreadPoolExecutor(max_workers=4) as executor:
         futures = {executor.submit(fetch_and_update, row[0], row[1]): row[0] for row in rows}
@@ -76,12 +81,9 @@ def main():
             auction_id, address = future.result()
             if address:
                 found += 1
-                # Write to DB (thread-safe)
-                db2 = sqlite3.connect(DB_PATH)
-                with _db_lock:
-                    db2.execute("UPDATE auctions SET address = ? WHERE id = ?", (address, auction_id))
-                    db2.commit()
-                db2.close()
+                pending.append((address, auction_id))
+                if len(pending) >= COMMIT_EVERY:
+                    flush()
                 updated += 1
             else:
                 errors += 1
@@ -89,6 +91,10 @@ def main():
             if (i + 1) % 50 == 0:
                 print(f"  Progress: {i+1}/{total} | Found: {found} | Errors: {errors}")
 
+    if pending:
+        flush()
+    db.close()
+
     print(f"\nDone. Updated {updated}/{total} records with real addresses.")
 
 
@@ -32,6 +32,8 @@ DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data',
 NOMINATIM_URL = 'https://nominatim.openstreetmap.org/search'
 REQUEST_DELAY = 1.1    # Nominatim ToS: max 1 req/sec
 NOMINATIM_TIMEOUT = 10
+SUMMARY_CITIES = ('гр. София', 'гр. Пловдив', 'гр. Варна', 'гр. Бургас', 'гр. Русе', 'гр. Стара Загора')
+COMMIT_EVERY = 50      # Flush batched UPDATEs this often, so an interrupted run keeps its progress
 
 
 def clean_address_for_geocoding(address: str, city: str) -> str | None:
@@ -140,7 +142,8 @@ def main():
         params.append(f"%{args.city}%")
     query += " ORDER BY city, id"
     if args.limit:
-        query += f" LIMIT {args.limit}"
+        query += " LIMIT ?"
+        params.append(args.limit)
 
     rows = db.execute(query, params).fetchall()
     total = len(rows)
@@ -151,6 +154,12 @@ def main():
 
     stats = {'text_match': 0, 'photon_match': 0, 'no_match': 0, 'no_address': 0}
     updated = 0
+    pending = []
+
+    def flush():
+        db.executemany("UPDATE auctions SET neighborhood = ? WHERE id = ?", pending)
+        db.commit()
+        pending.clear()
 
     for i, (auction_id, address, city, prop_type) in enumerate(rows):
         if not address or len(address) < 4:
@@ -179,20 +188,17 @@ def main():
             print(f"  [{i+1}/{total}] {city} | {address[:50]!r} -> {neighborhood!r} ({method})")
 
         if neighborhood and not args.dry_run:
-            db.execute(
-                "UPDATE auctions SET neighborhood = ? WHERE id = ?",
-                (neighborhood, auction_id)
-            )
+            pending.append((neighborhood, auction_id))
             updated += 1
-            if updated % 50 == 0:
-                db.commit()
+            if len(pending) >= COMMIT_EVERY:
+                flush()
 
         # Rate limit only when using Nominatim (ToS: 1 req/sec)
         if method == 'nominatim':
             time.sleep(REQUEST_DELAY)
 
-    if not args.dry_run:
-        db.commit()
+    if pending:
+        flush()
 
     print()
     print("=== RESULTS ===")
@@ -213,12 +219,17 @@ def main():
         print(f"\nCoverage after: {with_hood}/{total_active} ({100*with_hood//total_active}%)")
 
         print("\nTop neighborhoods per city:")
-        for city_row in ['гр. София', 'гр. Пловдив', 'гр. Варна', 'гр. Бургас', 'гр. Русе', 'гр. Стара Загора']:
-            hoods = db.execute("""
-                SELECT neighborhood, COUNT(*) cnt FROM auctions
-                WHERE city LIKE ? AND is_expired=0 AND neighborhood IS NOT NULL
-                GROUP BY neighborhood ORDER BY cnt DESC LIMIT 5
-            """, (f"%{city_row.split()[-1]}%",)).fetchall()
+        # Exact city match (no leading-wildcard LIKE), one grouped scan for all cities
+        top_hoods = {city: [] for city in SUMMARY_CITIES}
+        for city_row, hood, cnt in db.execute(f"""
+            SELECT city, neighborhood, COUNT(*) cnt FROM auctions
+            WHERE city IN ({','.join('?' * len(SUMMARY_CITIES))})
+              AND is_expired=0 AND neighborhood IS NOT NULL
+            GROUP BY city, neighborhood ORDER BY city, cnt DESC
+        """, SUMMARY_CITIES):
+            if len(top_hoods[city_row]) < 5:
+                top_hoods[city_row].append((hood, cnt))
+        for city_row, hoods in top_hoods.items():
             if hoods:
                 hood_str = ', '.join(f"{r[0]}({r[1]})" for r in hoods)
                 print(f"  {city_row}: {hood_str}")